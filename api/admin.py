@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import hmac
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+TOKEN: str | None = None
+
+
+def configure(token: str | None) -> None:
+    global TOKEN  # noqa: PLW0603
+    TOKEN = token or None
+
+
+def is_admin(token: str | None) -> bool:
+    """Whether ``token`` is the admin token. Always False when none is set."""
+    return (
+        TOKEN is not None
+        and token is not None
+        and hmac.compare_digest(token.encode(), TOKEN.encode())
+    )
+
+
+def require_admin(x_admin_token: str | None = Header(None)) -> None:
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+ROUTER = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import TYPE_CHECKING, Any
+
+from prometheus_client import Counter, Gauge, Histogram
+from starlette.responses import JSONResponse
+
+if TYPE_CHECKING:
+    from starlette.types import ASGIApp, Receive, Scope, Send
+
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+# POST only because the id list may not fit in a URL; still a read.
+READ_SUFFIXES = ("/batch_get",)
+
+# Long-lived or operational routes that must never queue behind API traffic;
+# streams are never coalesced either, as they have no result to share.
+EXEMPT_SUFFIXES = ("/events", "/metrics")
+
+IN_FLIGHT = Gauge(
+    "api_admission_in_flight", "Requests currently admitted", ["budget"],
+)
+QUEUE_DEPTH = Gauge(
+    "api_admission_queue_depth", "Requests waiting for admission", ["budget"],
+)
+SHED = Counter(
+    "api_admission_shed", "Requests rejected with 503", ["budget", "reason"],
+)
+WAIT = Histogram(
+    "api_admission_wait_seconds", "Time spent waiting for admission", ["budget"],
+)
+
+
+class Shed(Exception):  # noqa: N818
+    def __init__(self: Shed, reason: str) -> None:
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Budget:
+    """At most ``limit`` requests at once and at most ``queue`` waiting."""
+
+    def __init__(
+        self: Budget, name: str, limit: int, queue: int, timeout: float,
+    ) -> None:
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def acquire(self: Budget) -> None:
+        if self._semaphore.locked() and self.waiting >= self.queue:
+            raise Shed("queue_full")
+        self.waiting += 1
+        QUEUE_DEPTH.labels(self.name).inc()
+        start = time.perf_counter()
+        # Not wait_for: it runs the acquire in a task of its own, and if we
+        # are cancelled just as that task gets the permit, the permit is lost.
+        # Awaited directly, the semaphore gives it back when cancelled.
+        try:
+            async with asyncio.timeout(self.timeout):
+                await self._semaphore.acquire()
+        except TimeoutError:
+            raise Shed("timeout") from None
+        finally:
+            self.waiting -= 1
+            QUEUE_DEPTH.labels(self.name).dec()
+            WAIT.labels(self.name).observe(time.perf_counter() - start)
+        IN_FLIGHT.labels(self.name).inc()
+
+    def release(self: Budget) -> None:
+        IN_FLIGHT.labels(self.name).dec()
+        self._semaphore.release()
+
+
+class AdmissionMiddleware:
+    """Concurrency limits with bounded queues, separately for reads and writes.
+
+    Requests beyond ``limit + queue`` of their budget, or that wait longer
+    than ``timeout`` seconds, are answered straight away with a 503 and a
+    ``Retry-After`` header instead of piling up in front of the thread pool.
+    A limit of 0 leaves that kind of request unlimited.
+    """
+
+    def __init__(
+        self: AdmissionMiddleware,
+        app: ASGIApp,
+        *,
+        read_limit: int,
+        read_queue: int,
+        write_limit: int,
+        write_queue: int,
+        timeout: float = 5.0,
+        retry_after: int = 1,
+    ) -> None:
+        self.app = app
+        self.retry_after = retry_after
+        self.budgets = {
+            name: Budget(name, limit, queue, timeout)
+            for name, limit, queue in (
+                ("read", read_limit, read_queue),
+                ("write", write_limit, write_queue),
+            )
+            if limit > 0
+        }
+
+    async def __call__(
+        self: AdmissionMiddleware, scope: Scope, receive: Receive, send: Send,
+    ) -> None:
+        if scope["type"] != "http" or scope["path"].endswith(EXEMPT_SUFFIXES):
+            await self.app(scope, receive, send)
+            return
+        budget = self.budgets.get(
+            "read"
+            if scope["method"] in READ_METHODS or scope["path"].endswith(READ_SUFFIXES)
+            else "write",
+        )
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await budget.acquire()
+        except Shed as shed:
+            SHED.labels(budget.name, shed.reason).inc()
+            response = self.overloaded(budget)
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            budget.release()
+
+    def overloaded(self: AdmissionMiddleware, budget: Budget) -> Any:
+        return JSONResponse(
+            {"detail": f"Too many concurrent {budget.name}s, retry later"},
+            status_code=503,
+            headers={"Retry-After": str(self.retry_after)},
+        )
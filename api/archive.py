@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import anyio.to_thread
+import asyncclick as click
+from sqlmodel import Session, create_engine
+
+from . import shards
+from .loaders import CHUNK_SIZE
+from .models import Endpointer
+
+if TYPE_CHECKING:
+    from sqlalchemy.future import Engine as SQLAlchemyEngine
+
+    from .db import Database
+
+LOG = logging.getLogger(__name__)
+
+
+def cutoff(older_than: timedelta) -> datetime:
+    # created_at is set by SQLite's CURRENT_TIMESTAMP, which is UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None) - older_than
+
+
+def archive_all(
+    engine: SQLAlchemyEngine,
+    before: datetime,
+    batch_size: int = CHUNK_SIZE,
+    pause: float = 0.05,
+    *,
+    db: Database | None = None,
+) -> dict[str, int]:
+    """Archive everything from before ``before``, in batches.
+
+    Each batch is its own short write transaction, with a ``pause`` in
+    between so API writes aren't locked out for the whole run. Archived
+    rows are dropped from ``db``'s lookup caches.
+    """
+    moved = {}
+    for endpointer in Endpointer.__subclasses__():
+        if endpointer.ARCHIVE_BY is None:
+            continue
+        moved[endpointer.prefix] = 0
+        while True:
+            with Session(engine, info={"db": db}) as session:
+                batch = endpointer.archive(session, before, batch_size)
+                session.commit()
+            moved[endpointer.prefix] += batch
+            if batch < batch_size:
+                break
+            time.sleep(pause)
+    return moved
+
+
+async def run(
+    db: Database, older_than: timedelta, every: float, batch_size: int,
+) -> None:
+    while True:
+        await asyncio.sleep(every)
+        moved = await anyio.to_thread.run_sync(
+            functools.partial(
+                archive_all, db.writer, cutoff(older_than), batch_size, db=db,
+            ),
+        )
+        if any(moved.values()):
+            LOG.info("archived", extra={"moved": moved})
+
+
+@click.command()
+@click.option('--db-path', required=True)
+@click.option('--older-than-days', type=float, required=True)
+@click.option('--batch-size', default=CHUNK_SIZE)
+@click.option('--db-shards/--no-db-shards', default=False)
+async def archive(db_path, older_than_days, batch_size, db_shards):
+    """Move posts and comments older than the cutoff to the archive tables."""
+    engine = create_engine(f"sqlite:///{Path(db_path)}")
+    shard_files = shards.files(Path(db_path)) if db_shards else {}
+    shards.attach(engine, shard_files)
+    Endpointer.init(engine, shards=shard_files)
+    moved = archive_all(engine, cutoff(timedelta(days=older_than_days)), batch_size)
+    for prefix, count in moved.items():
+        click.echo(f"Archived {count} {prefix}")
+
+
+if __name__ == "__main__":
+    archive()
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import logging
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from fastapi import HTTPException
+from prometheus_client import Counter, Gauge, Histogram
+
+from . import admin
+
+if TYPE_CHECKING:
+    from sqlalchemy.future import Engine as SQLAlchemyEngine
+
+LOG = logging.getLogger(__name__)
+
+DURATION = Histogram(
+    "api_backup_seconds", "Backup duration", buckets=(1, 5, 15, 60, 300, 900, 3600),
+)
+RUNS = Counter("api_backup_runs", "Backups run", ["outcome"])
+RESTARTS = Counter("api_backup_restarts", "Backups restarted by concurrent writes")
+LAST_SUCCESS = Gauge("api_backup_last_success_timestamp", "When a backup last succeeded")
+SIZE = Gauge("api_backup_bytes", "Size of the last snapshot")
+
+
+class TooManyRestarts(Exception):  # noqa: N818
+    pass
+
+
+@dataclass
+class Progress:
+    started: float
+    total: int = 0
+    remaining: int = 0
+    restarts: int = 0
+
+
+class Backups:
+    """Online snapshots of the primary with SQLite's backup API.
+
+    Pages are copied ``pages`` at a time with a ``sleep`` in between, so API
+    requests keep running during a backup. A write from another connection
+    makes SQLite restart the copy; after ``max_restarts`` the remainder is
+    copied in one step instead. Snapshots are written as
+    ``<db>-<UTC time>.db`` to ``directory`` and only the newest ``keep`` are
+    kept. Attached databases (see shards.py) are copied alongside, as
+    ``<db>-<UTC time>.<shard>.db``.
+    """
+
+    def __init__(
+        self: Backups,
+        engine: SQLAlchemyEngine,
+        directory: Path,
+        *,
+        pages: int = 256,
+        sleep: float = 0.01,
+        keep: int = 7,
+        max_restarts: int = 10,
+    ) -> None:
+        self.engine = engine
+        self.directory = directory
+        self.pages = pages
+        self.sleep = sleep
+        self.keep = keep
+        self.max_restarts = max_restarts
+        self.stem = Path(engine.url.database or "db").stem
+        self.progress: Progress | None = None
+        self._lock = threading.Lock()
+        directory.mkdir(parents=True, exist_ok=True)
+
+    def snapshots(self: Backups) -> list[Path]:
+        name = re.compile(rf"{re.escape(self.stem)}-\d{{8}}T\d{{6}}_\d{{6}}\.db")
+        return sorted(
+            (
+                path
+                for path in self.directory.glob(f"{self.stem}-*.db")
+                if name.fullmatch(path.name)
+            ),
+            reverse=True,
+        )
+
+    @staticmethod
+    def shard_copies(snapshot: Path) -> list[Path]:
+        return sorted(snapshot.parent.glob(f"{snapshot.stem}.*.db"))
+
+    def run(self: Backups, conn: sqlite3.Connection | None = None) -> Path:
+        """Take a snapshot, through ``conn`` or a fresh pool connection."""
+        self._claim()
+        return self._run_claimed(conn)
+
+    def start(self: Backups) -> None:
+        """Take a snapshot on a thread of its own.
+
+        The backup is claimed before the thread starts, so of two concurrent
+        calls one gets the RuntimeError instead of both starting a thread.
+        """
+        self._claim()
+        try:
+            threading.Thread(target=self._run_claimed, name="backup", daemon=True).start()
+        except BaseException:
+            self._lock.release()
+            raise
+
+    def _claim(self: Backups) -> None:
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A backup is already running")
+
+    def _run_claimed(self: Backups, conn: sqlite3.Connection | None = None) -> Path:
+        raw = None
+        try:
+            if conn is None:
+                raw = self.engine.raw_connection()
+                conn = raw.driver_connection
+            return self._run(conn)
+        finally:
+            if raw is not None:
+                raw.close()
+            self.progress = None
+            self._lock.release()
+
+    def _run(self: Backups, conn: sqlite3.Connection) -> Path:
+        now = datetime.now(timezone.utc)
+        target = self.directory / f"{self.stem}-{now:%Y%m%dT%H%M%S_%f}.db"
+        attached = [
+            name
+            for _, name, file in conn.execute("PRAGMA database_list")
+            if name not in ("main", "temp") and file
+        ]
+        self.progress = progress = Progress(time.monotonic())
+        start = time.perf_counter()
+        try:
+            # the main file last, so a listed snapshot is always complete
+            for name in attached:
+                self._copy(conn, name, target.with_suffix(f".{name}.db"), progress)
+            self._copy(conn, "main", target, progress)
+        except Exception:
+            for partial in self.directory.glob(f"{target.stem}*.partial"):
+                partial.unlink()
+            for copy in self.shard_copies(target):
+                copy.unlink()
+            RUNS.labels("error").inc()
+            LOG.exception("backup failed")
+            raise
+        duration = time.perf_counter() - start
+        size = sum(path.stat().st_size for path in (target, *self.shard_copies(target)))
+        DURATION.observe(duration)
+        RUNS.labels("ok").inc()
+        LAST_SUCCESS.set_to_current_time()
+        SIZE.set(size)
+        LOG.info(
+            "backup",
+            extra={
+                "file": str(target),
+                "duration": round(duration, 3),
+                "restarts": progress.restarts,
+            },
+        )
+        for old in self.snapshots()[self.keep :]:
+            for path in (old, *self.shard_copies(old)):
+                path.unlink(missing_ok=True)
+        return target
+
+    def _copy(
+        self: Backups,
+        conn: sqlite3.Connection,
+        name: str,
+        target: Path,
+        progress: Progress,
+    ) -> None:
+        partial = target.with_suffix(".partial")
+        progress.total = progress.remaining = 0
+
+        def step(status: int, remaining: int, total: int) -> None:  # noqa: ARG001
+            if remaining > progress.remaining and progress.total:
+                progress.restarts += 1
+                RESTARTS.inc()
+                if progress.restarts > self.max_restarts:
+                    raise TooManyRestarts
+            progress.total, progress.remaining = total, remaining
+            time.sleep(self.sleep)
+
+        with sqlite3.connect(partial) as dest:
+            try:
+                conn.backup(dest, pages=self.pages, progress=step, name=name)
+            except TooManyRestarts:
+                conn.backup(dest, name=name)
+        dest.close()
+        partial.rename(target)
+
+    def task(self: Backups, conn: sqlite3.Connection, idle: Any) -> str:  # noqa: ARG002
+        """A maintenance.Task body."""
+        self.run(conn)
+        return "ok"
+
+    def status(self: Backups) -> dict[str, Any]:
+        return {
+            "running": asdict(self.progress) if self.progress else None,
+            "snapshots": [
+                {
+                    "name": path.name,
+                    "bytes": sum(
+                        p.stat().st_size for p in (path, *self.shard_copies(path))
+                    ),
+                }
+                for path in self.snapshots()
+            ],
+        }
+
+
+BACKUPS: Backups | None = None
+
+
+def configured() -> Backups:
+    if BACKUPS is None:
+        raise HTTPException(status_code=503, detail="Backups are not configured")
+    return BACKUPS
+
+
+@admin.ROUTER.get("/backups")
+def list_backups() -> dict[str, Any]:
+    return configured().status()
+
+
+@admin.ROUTER.post("/backups", status_code=202)
+def start_backup() -> dict[str, Any]:
+    backups = configured()
+    try:
+        backups.start()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from None
+    return backups.status()
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable
+
+
+class LookupCache:
+    """A thread-safe LRU of rows keyed by primary key, one per database.
+
+    Only detached copies are stored, so cached rows can be handed out across
+    sessions and threads. Callers must treat them as read-only.
+
+    A load that misses takes a ``stamp`` before it reads the database and
+    hands it to ``put_many``. Rows invalidated after the stamp was taken are
+    then not stored, as the load may have read them before the write
+    committed.
+    """
+
+    def __init__(self: LookupCache, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._rows: OrderedDict[Hashable, Any] = OrderedDict()
+        # key -> generation it was last invalidated at, the newest maxsize;
+        # puts stamped before _floor can't be checked and are dropped
+        self._invalidated: OrderedDict[Hashable, int] = OrderedDict()
+        self._generation = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def __len__(self: LookupCache) -> int:
+        return len(self._rows)
+
+    def get_many(
+        self: LookupCache, keys: Iterable[Hashable],
+    ) -> tuple[dict[Hashable, Any], set[Hashable]]:
+        """Return the cached rows for ``keys`` and the keys that weren't."""
+        found: dict[Hashable, Any] = {}
+        missing: set[Hashable] = set()
+        with self._lock:
+            for key in keys:
+                if key in self._rows:
+                    self._rows.move_to_end(key)
+                    found[key] = self._rows[key]
+                else:
+                    missing.add(key)
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def stamp(self: LookupCache) -> int:
+        with self._lock:
+            return self._generation
+
+    def put_many(
+        self: LookupCache, rows: dict[Hashable, Any], stamp: int | None = None,
+    ) -> None:
+        with self._lock:
+            if stamp is not None and stamp < self._floor:
+                return
+            for key, row in rows.items():
+                if stamp is not None and self._invalidated.get(key, -1) > stamp:
+                    continue
+                self._rows[key] = row
+                self._rows.move_to_end(key)
+            while len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+
+    def invalidate(self: LookupCache, key: Hashable) -> None:
+        with self._lock:
+            self._generation += 1
+            self._rows.pop(key, None)
+            self._invalidated[key] = self._generation
+            self._invalidated.move_to_end(key)
+            while len(self._invalidated) > self.maxsize:
+                _, self._floor = self._invalidated.popitem(last=False)
+
+    def clear(self: LookupCache) -> None:
+        with self._lock:
+            self._generation += 1
+            self._floor = self._generation
+            self._rows.clear()
+            self._invalidated.clear()
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, Callable, TypeVar
+
+from sqlmodel import Session
+
+if TYPE_CHECKING:
+    from sqlalchemy.future import Engine as SQLAlchemyEngine
+
+T = TypeVar("T")
+
+Write = Callable[[Session], Any]
+
+
+class WriteCoalescer:
+    """Group commit: run writes that arrive close together in one transaction.
+
+    ``submit`` blocks the calling (request) thread until its write has been
+    committed. A single background thread collects writes until either
+    ``max_batch`` are queued or ``max_delay`` seconds have passed since the
+    first one, then runs each inside its own SAVEPOINT of one shared
+    transaction. A write that raises only rolls back its own savepoint and
+    gets the exception back; everybody else still commits.
+    """
+
+    def __init__(
+        self: WriteCoalescer,
+        engine: SQLAlchemyEngine,
+        *,
+        max_batch: int = 64,
+        max_delay: float = 0.005,
+    ) -> None:
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.writes = 0
+        self._queue: queue.Queue[tuple[Write, Future[Any]] | None] = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="write-coalescer", daemon=True,
+        )
+        self._thread.start()
+
+    def submit(self: WriteCoalescer, write: Callable[[Session], T]) -> T:
+        future: Future[T] = Future()
+        self._queue.put((write, future))
+        return future.result()
+
+    def close(self: WriteCoalescer) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self: WriteCoalescer) -> None:
+        while (first := self._queue.get()) is not None:
+            batch = [first]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._commit(batch)
+                    return
+                batch.append(item)
+            self._commit(batch)
+
+    def _commit(self: WriteCoalescer, batch: list[tuple[Write, Future[Any]]]) -> None:
+        outcomes: list[tuple[Future[Any], Any, BaseException | None]] = []
+        try:
+            with self.engine.connect() as conn:
+                # pysqlite only opens a transaction lazily on DML, which would
+                # make every RELEASE below a commit of its own. A deferred
+                # BEGIN: IMMEDIATE would lock every attached shard (see
+                # shards.py), not just the ones the batch writes to. Each
+                # write starts with its INSERT, so none has to upgrade a
+                # read to a write lock.
+                conn.exec_driver_sql("BEGIN")
+                with Session(bind=conn, expire_on_commit=False) as session:
+                    for write, future in batch:
+                        try:
+                            with session.begin_nested():
+                                outcomes.append((future, write(session), None))
+                        except Exception as e:  # noqa: BLE001
+                            outcomes.append((future, None, e))
+                    session.commit()
+                conn.commit()
+        except Exception as e:  # noqa: BLE001
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.writes += len(batch)
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any
+
+import anyio.to_thread
+from prometheus_client import Gauge, Histogram
+from sqlalchemy.pool import QueuePool
+
+# Connections beyond one per request thread, for background threads (write
+# coalescer, maintenance).
+POOL_OVERFLOW = 4
+
+THREADS_TOTAL = Gauge("api_threadpool_size", "Worker threads for sync routes")
+THREADS_IN_USE = Gauge("api_threadpool_in_use", "Worker threads running a route")
+THREADS_WAITING = Gauge(
+    "api_threadpool_waiting", "Sync routes/dependencies waiting for a thread",
+)
+THREAD_WAIT = Histogram(
+    "api_threadpool_wait_seconds", "Time a probe waited for a worker thread",
+)
+# by pool: "writer", "replica-0", ...
+POOL_WAIT = Histogram(
+    "api_db_pool_checkout_seconds",
+    "Time spent waiting for a DB connection",
+    ["pool"],
+)
+POOL_CHECKED_OUT = Gauge(
+    "api_db_pool_checked_out", "DB connections currently checked out", ["pool"],
+)
+
+
+class TimedQueuePool(QueuePool):
+    """A QueuePool that records how long checkouts wait.
+
+    Metrics are labeled with the pool's logging name, see ``engine_kwargs``.
+    """
+
+    @property
+    def label(self: TimedQueuePool) -> str:
+        return self._orig_logging_name or "default"
+
+    def _do_get(self: TimedQueuePool) -> Any:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.labels(self.label).observe(time.perf_counter() - start)
+            POOL_CHECKED_OUT.labels(self.label).set(self.checkedout())
+
+    def _do_return_conn(self: TimedQueuePool, record: Any) -> None:
+        super()._do_return_conn(record)
+        POOL_CHECKED_OUT.labels(self.label).set(self.checkedout())
+
+
+def engine_kwargs(threads: int, name: str = "writer") -> dict[str, Any]:
+    """create_engine arguments giving every worker thread its own connection.
+
+    ``name`` tells the engine's pool apart in logs and metrics.
+    """
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": threads,
+        "max_overflow": POOL_OVERFLOW,
+        "pool_logging_name": name,
+    }
+
+
+def configure_threads(threads: int) -> None:
+    """Size the thread pool sync routes and dependencies run on.
+
+    Must be called from the event loop that will serve requests.
+    """
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = threads
+    THREADS_TOTAL.set_function(lambda: limiter.total_tokens)
+    THREADS_IN_USE.set_function(lambda: limiter.borrowed_tokens)
+    THREADS_WAITING.set_function(lambda: limiter.statistics().tasks_waiting)
+
+
+async def probe_thread_wait(interval: float = 1.0) -> None:
+    """Time a no-op through the thread pool every ``interval`` seconds.
+
+    The probe queues on the same limiter as requests, so its wait is what a
+    request arriving at that moment would have waited, without timing every
+    request.
+    """
+    while True:
+        start = time.perf_counter()
+        await anyio.to_thread.run_sync(lambda: None)
+        THREAD_WAIT.observe(time.perf_counter() - start)
+        await asyncio.sleep(interval)
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from fastapi import HTTPException
+from prometheus_client import Counter, Gauge, Histogram
+
+T = TypeVar("T")
+
+# ~16 MiB and some tens of milliseconds per hash; hashlib.scrypt releases the
+# GIL while it runs, so a thread pool gives real parallelism.
+SCRYPT_N = 2**14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+# Callers wait for a hash on one of the route threads; admitting more hashes
+# than a fraction of them would let a burst of logins starve every other route.
+MAX_THREAD_SHARE = 4
+
+IN_FLIGHT = Gauge("api_hash_in_flight", "Password hashes being computed")
+QUEUE_DEPTH = Gauge("api_hash_queue_depth", "Password hashes waiting for a worker")
+REJECTED = Counter("api_hash_rejected", "Password hashes refused with 503")
+DURATION = Histogram("api_hash_seconds", "Time to hash or verify a password")
+
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode()
+
+
+def hash_password(password: str, *, n: int = SCRYPT_N) -> str:
+    salt = os.urandom(SALT_BYTES)
+    digest = hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=SCRYPT_R, p=SCRYPT_P,
+    )
+    return f"scrypt${n}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+
+def is_hashed(stored: str) -> bool:
+    return stored.startswith("scrypt$")
+
+
+def needs_rehash(stored: str, *, n: int = SCRYPT_N) -> bool:
+    """Whether ``stored`` is plaintext from before hashing, or weaker than ``n``."""
+    if not is_hashed(stored):
+        return True
+    try:
+        return int(stored.split("$")[1]) < n
+    except (IndexError, ValueError):
+        return True
+
+
+def verify_password(password: str, stored: str) -> bool:
+    if not is_hashed(stored):
+        # rows written before passwords were hashed hold them in plaintext
+        return hmac.compare_digest(password.encode(), stored.encode())
+    try:
+        _, n, r, p, salt, digest = stored.split("$")
+    except ValueError:
+        return False
+    expected = base64.b64decode(digest)
+    actual = hashlib.scrypt(
+        password.encode(),
+        salt=base64.b64decode(salt),
+        n=int(n),
+        r=int(r),
+        p=int(p),
+        dklen=len(expected),
+    )
+    return hmac.compare_digest(actual, expected)
+
+
+class HashPool:
+    """A small, dedicated thread pool for password hashing.
+
+    At most ``workers`` hashes run at once and at most ``queue`` more wait;
+    beyond that callers get a 503 straight away instead of tying up request
+    threads behind a pile of scrypt calls.
+    """
+
+    def __init__(
+        self: HashPool, workers: int = 2, queue: int = 8, n: int = SCRYPT_N,
+    ) -> None:
+        self.n = n
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="hash")
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        self._dummy: str | None = None
+
+    def _run(self: HashPool, func: Callable[..., T], *args: Any) -> T:
+        if not self._slots.acquire(blocking=False):
+            REJECTED.inc()
+            raise HTTPException(
+                status_code=503,
+                detail="Too many password operations, retry later",
+                headers={"Retry-After": "1"},
+            )
+        QUEUE_DEPTH.inc()
+
+        def timed() -> T:
+            QUEUE_DEPTH.dec()
+            IN_FLIGHT.inc()
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                DURATION.observe(time.perf_counter() - start)
+                IN_FLIGHT.dec()
+
+        try:
+            return self._executor.submit(timed).result()
+        finally:
+            self._slots.release()
+
+    def hash(self: HashPool, password: str) -> str:
+        return self._run(lambda: hash_password(password, n=self.n))
+
+    def verify(self: HashPool, password: str, stored: str | None) -> bool:
+        if stored is None:
+            # Unknown accounts cost as much as known ones, so response times
+            # don't tell which emails are registered.
+            if self._dummy is None:
+                self._dummy = self.hash("")
+            self._run(verify_password, password, self._dummy)
+            return False
+        return self._run(verify_password, password, stored)
+
+    def needs_rehash(self: HashPool, stored: str) -> bool:
+        return needs_rehash(stored, n=self.n)
+
+    def shutdown(self: HashPool) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+POOL = HashPool()
+
+
+def configure(
+    workers: int, queue: int, n: int = SCRYPT_N, *, threads: int | None = None,
+) -> HashPool:
+    """Replace ``POOL``, admitting at most ``threads // MAX_THREAD_SHARE`` hashes."""
+    global POOL  # noqa: PLW0603
+    if threads is not None:
+        queue = min(queue, max(threads // MAX_THREAD_SHARE - workers, 0))
+    old, POOL = POOL, HashPool(workers, queue, n)
+    old.shutdown()
+    return POOL
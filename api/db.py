@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Iterable
+
+from .cache import LookupCache
+from .events import EventHub
+
+if TYPE_CHECKING:
+    from sqlalchemy.future import Engine as SQLAlchemyEngine
+
+    from starlette.requests import HTTPConnection
+
+    from .coalesce import WriteCoalescer
+
+# How a client names itself for read-your-writes; see ``client_key``.
+CLIENT_HEADER = "x-client-id"
+CLIENT_COOKIE = "client_id"
+
+
+def client_key(conn: HTTPConnection) -> str | None:
+    """Who is reading or writing, for read-your-writes.
+
+    Clients behind one proxy or NAT share an address, so an explicit
+    ``X-Client-Id`` header or ``client_id`` cookie wins; the address is only
+    a fallback for clients that send neither.
+    """
+    if explicit := conn.headers.get(CLIENT_HEADER) or conn.cookies.get(CLIENT_COOKIE):
+        return f"id:{explicit}"
+    return f"ip:{conn.client.host}" if conn.client else None
+
+
+class Database:
+    """The primary (write) engine plus any number of read engines.
+
+    Reads are spread over the read engines round-robin. When
+    ``read_your_writes`` is non-zero, a client that wrote less than that many
+    seconds ago has its reads sent to the primary instead, so it never reads a
+    replica that hasn't caught up with its own write yet.
+
+    With a ``coalescer``, creates are group-committed on the primary instead
+    of each committing in its own request session.
+
+    Each app has its own, as ``app.state.db``, so several apps (or tests) can
+    run against different databases in one process. Everything derived from
+    the database lives here too, so it can't leak between apps: the lookup
+    ``caches`` by Endpointer prefix, the event ``hubs`` and stats.py's
+    ``aggregates``.
+    """
+
+    def __init__(
+        self: Database,
+        writer: SQLAlchemyEngine,
+        readers: Iterable[SQLAlchemyEngine] = (),
+        *,
+        read_your_writes: float = 0.0,
+        coalescer: WriteCoalescer | None = None,
+    ) -> None:
+        self.writer = writer
+        self.coalescer = coalescer
+        self.readers = tuple(readers) or (writer,)
+        self.read_your_writes = read_your_writes
+        self._next_reader = itertools.cycle(self.readers)
+        self._lock = threading.Lock()
+        self._last_writes: dict[str, float] = {}
+        self.caches: dict[str, LookupCache] = {}
+        self.hubs: dict[str, EventHub] = {}
+        self.aggregates: dict[str, Any] = {}
+
+    def hub(self: Database, prefix: str) -> EventHub:
+        if (found := self.hubs.get(prefix)) is None:
+            found = self.hubs.setdefault(prefix, EventHub())
+        return found
+
+    def reader(self: Database, client: str | None = None) -> SQLAlchemyEngine:
+        if client is not None and self._wrote_recently(client):
+            return self.writer
+        with self._lock:
+            return next(self._next_reader)
+
+    def wrote(self: Database, client: str | None) -> None:
+        if not self.read_your_writes or client is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._last_writes[client] = now
+            if len(self._last_writes) > 1024:  # noqa: PLR2004
+                self._last_writes = {
+                    c: t
+                    for c, t in self._last_writes.items()
+                    if now - t < self.read_your_writes
+                }
+
+    def _wrote_recently(self: Database, client: str) -> bool:
+        if not self.read_your_writes:
+            return False
+        last = self._last_writes.get(client)
+        return last is not None and time.monotonic() - last < self.read_your_writes
+
+    def dispose(self: Database) -> None:
+        if self.coalescer is not None:
+            self.coalescer.close()
+        for engine in {self.writer, *self.readers}:
+            engine.dispose()
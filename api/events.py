@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import secrets
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Iterator
+
+KEEPALIVE_INTERVAL = 15.0
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    type: str
+    data: dict[str, Any]
+
+    def encode(self: Event, epoch: str) -> str:
+        return (
+            f"id: {epoch}-{self.id}\nevent: {self.type}\n"
+            f"data: {json.dumps(self.data)}\n\n"
+        )
+
+
+class EventHub:
+    """In-process pub/sub for one Endpointer's changes.
+
+    ``publish`` may be called from any thread (the sync routes run in a
+    thread pool); events are handed to each subscriber's event loop. The last
+    ``maxlen`` events are kept in a ring buffer so reconnecting clients can
+    resume from their ``Last-Event-ID``.
+
+    Ids are ``<epoch>-<n>``, with an epoch picked per hub: ``n`` starts over
+    when the process restarts. A client resuming from an id of another
+    epoch, or one that was never handed out, gets a ``reset`` event, as it
+    may have missed changes.
+    """
+
+    def __init__(self: EventHub, maxlen: int = 1024, queue_size: int = 256) -> None:
+        self.queue_size = queue_size
+        self.epoch = secrets.token_hex(4)
+        self._events: deque[Event] = deque(maxlen=maxlen)
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._subscribers: set[tuple[asyncio.AbstractEventLoop, asyncio.Queue[Event | None]]] = set()
+
+    def publish(self: EventHub, type_: str, data: dict[str, Any]) -> Event:
+        with self._lock:
+            event = Event(self._next_id, type_, data)
+            self._next_id += 1
+            self._events.append(event)
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, event)
+            except RuntimeError:  # loop already closed
+                with self._lock:
+                    self._subscribers.discard((loop, queue))
+        return event
+
+    @staticmethod
+    def _deliver(queue: asyncio.Queue[Event | None], event: Event) -> None:
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client this far behind is disconnected; it resumes from its
+            # Last-Event-ID, replaying from the ring buffer.
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    def since(self: EventHub, last_id: int) -> list[Event] | None:
+        """Buffered events after ``last_id``, or None if some were dropped.
+
+        None too for an id that hasn't been handed out yet.
+        """
+        with self._lock:
+            if last_id >= self._next_id:
+                return None
+            if self._events and last_id < self._events[0].id - 1:
+                return None
+            return [event for event in self._events if event.id > last_id]
+
+    def parse(self: EventHub, last_event_id: str) -> int | None:
+        """The ``n`` of an id of this hub's epoch, else None."""
+        epoch, _, n = last_event_id.rpartition("-")
+        if epoch != self.epoch or not n.isdigit():
+            return None
+        return int(n)
+
+    @contextmanager
+    def subscribe(self: EventHub) -> Iterator[asyncio.Queue[Event | None]]:
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(self.queue_size))
+        with self._lock:
+            self._subscribers.add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+    async def stream(
+        self: EventHub,
+        last_event_id: str | None,
+        matches: Callable[[Event], bool],
+        is_disconnected: Callable[[], Any],
+    ) -> AsyncIterator[str]:
+        with self.subscribe() as queue:
+            seen = 0
+            if last_event_id is not None:
+                last_id = self.parse(last_event_id)
+                if last_id is None or (backlog := self.since(last_id)) is None:
+                    yield "event: reset\ndata: {}\n\n"
+                    backlog = self.since(0) or []
+                for event in backlog:
+                    seen = event.id
+                    if matches(event):
+                        yield event.encode(self.epoch)
+            while not await is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    return
+                if event.id > seen and matches(event):
+                    yield event.encode(self.epoch)
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import TYPE_CHECKING, Any, Iterable
+
+from sqlmodel import Session, select
+
+if TYPE_CHECKING:
+    from sqlalchemy.orm import InstrumentedAttribute
+
+# Comfortably below SQLite's host parameter limit, which is as low as 999 on
+# older builds.
+CHUNK_SIZE = 500
+
+def chunked(keys: Iterable[Any], size: int = CHUNK_SIZE) -> Iterable[list[Any]]:
+    keys = list(keys)
+    for i in range(0, len(keys), size):
+        yield keys[i : i + size]
+
+
+def load_many(
+    session: Session, column: InstrumentedAttribute[Any], keys: Iterable[Any],
+) -> list[Any]:
+    """Load every row whose ``column`` is in ``keys``, one query per chunk.
+
+    ``column`` may belong to an aliased entity, e.g. ``Endpointer.source``.
+    """
+    keys = {key for key in keys if key is not None}
+    entity = column.parent.entity
+    order = [getattr(entity, pk.key) for pk in column.parent.mapper.primary_key]
+    rows: list[Any] = []
+    for chunk in chunked(sorted(keys)):
+        query = (
+            select(entity)
+            .where(column.in_(chunk))  # type: ignore[attr-defined]
+            .order_by(*order)
+        )
+        rows.extend(session.exec(query).all())
+    return rows
+
+
+def index_by(
+    session: Session, column: InstrumentedAttribute[Any], keys: Iterable[Any],
+) -> dict[Any, Any]:
+    """Like ``load_many``, keyed by ``column``; for unique columns."""
+    return {getattr(row, column.key): row for row in load_many(session, column, keys)}
+
+
+def group_by(
+    session: Session, column: InstrumentedAttribute[Any], keys: Iterable[Any],
+) -> dict[Any, list[Any]]:
+    """Like ``load_many``, grouped by ``column``; for non-unique columns."""
+    groups: dict[Any, list[Any]] = defaultdict(list)
+    for row in load_many(session, column, keys):
+        groups[getattr(row, column.key)].append(row)
+    return groups
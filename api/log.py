@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from typing import Any, Iterable
+
+# Attributes every LogRecord has; anything else was passed via ``extra=`` and
+# becomes a field of its own.
+RESERVED = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and extras."""
+
+    def format(self: JsonFormatter, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry |= {
+            key: value for key, value in vars(record).items() if key not in RESERVED
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DebugSampler(logging.Filter):
+    """Let through only a ``rate`` fraction of DEBUG records."""
+
+    def __init__(self: DebugSampler, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self: DebugSampler, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random.random() < self.rate  # noqa: S311
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    dropped = 0
+
+    # The stock handler formats the message in the calling thread; leave all
+    # of that to the listener. Records are handed over as they are, so
+    # arguments must not be mutated after logging them.
+    def prepare(self: _QueueHandler, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self: _QueueHandler, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup(
+    level: str = "INFO",
+    levels: Iterable[tuple[str, str]] = (),
+    *,
+    debug_sample: float = 1.0,
+    max_queued: int = 10_000,
+    stream: Any = None,
+) -> logging.handlers.QueueListener:
+    """Send the ``api`` loggers through a queue to a background writer thread.
+
+    Request threads only append to a bounded queue; when the writer falls
+    behind, records are dropped rather than blocking. ``levels`` sets levels
+    for individual loggers (e.g. ``("api.models", "DEBUG")``). Call
+    ``stop()`` on the returned listener to flush on shutdown.
+    """
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter())
+    records: queue.Queue[logging.LogRecord] = queue.Queue(max_queued)
+    listener = logging.handlers.QueueListener(
+        records, handler, respect_handler_level=True,
+    )
+
+    root = logging.getLogger("api")
+    for old in [h for h in root.handlers if isinstance(h, _QueueHandler)]:
+        root.removeHandler(old)
+    enqueue = _QueueHandler(records)
+    if debug_sample < 1:
+        enqueue.addFilter(DebugSampler(debug_sample))
+    root.addHandler(enqueue)
+    root.setLevel(level.upper())
+    root.propagate = False
+    for name, name_level in levels:
+        logging.getLogger(name).setLevel(name_level.upper())
+
+    listener.start()
+    return listener
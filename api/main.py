@@ -1,15 +1,34 @@
 from __future__ import annotations
 
 from contextlib import asynccontextmanager
+from datetime import timedelta
 
 from pathlib import Path
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import RedirectResponse
+from prometheus_fastapi_instrumentator import Instrumentator
 from sqlmodel import create_engine
 
+from .admission import AdmissionMiddleware
+from .coalesce import WriteCoalescer
+from .singleflight import SingleFlightMiddleware
 from .models import Endpointer
-from . import seeder
+from . import (
+    admin,
+    archive,
+    backup,
+    concurrency,
+    credentials,
+    log,
+    maintenance,
+    profiling,
+    seeder,
+    shards,
+    slowlog,
+    stats,
+)
 import uvicorn
 import asyncclick as click
 import asyncio
@@ -21,14 +40,50 @@ async def do_seed(server):
     await seeder.main()
 
 
-@click.command()
-@click.option('--seed/--no-seed', default=False)
-@click.option('--db-path', required=True)
-@click.option('--db-echo/--no-db-echo', default=False)
-@click.option('--db-wipe-on-start/--no-db-wipe-on-start', default=False)
-async def start(seed, db_path, db_echo, db_wipe_on_start):
+def create_app(
+    *,
+    profile: bool = False,
+    profile_dir: Path = Path('profiles'),
+    profile_sample_rate: float = 0.0,
+    max_concurrent_reads: int = 0,
+    max_queued_reads: int = 64,
+    max_concurrent_writes: int = 0,
+    max_queued_writes: int = 16,
+    admission_timeout: float = 5.0,
+    coalesce_reads: bool = False,
+    coalesce_per_client: bool = False,
+    route_context: bool = True,
+) -> FastAPI:
+    """The API with its middleware and routes; see Endpointer.connect for its database."""
     app = FastAPI()
 
+    # added first, i.e. innermost, so queueing in front of admission isn't
+    # part of the profile
+    if profile:
+        app.add_middleware(
+            profiling.ProfilingMiddleware,
+            directory=profile_dir,
+            sample_rate=profile_sample_rate,
+        )
+
+    if max_concurrent_reads or max_concurrent_writes:
+        app.add_middleware(
+            AdmissionMiddleware,
+            read_limit=max_concurrent_reads,
+            read_queue=max_queued_reads,
+            write_limit=max_concurrent_writes,
+            write_queue=max_queued_writes,
+            timeout=admission_timeout,
+        )
+
+    # outside admission control, so requests waiting on a shared flight
+    # don't hold a slot
+    if coalesce_reads:
+        app.add_middleware(SingleFlightMiddleware, per_client=coalesce_per_client)
+
+    if route_context:
+        app.add_middleware(slowlog.RouteMiddleware)
+
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
@@ -37,19 +92,209 @@ async def start(seed, db_path, db_echo, db_wipe_on_start):
         allow_headers=["*"],
     )
 
+    @app.get("/", include_in_schema=False)
+    def root() -> RedirectResponse:
+        return RedirectResponse("/docs")
+
     Endpointer.init_app(app)
+    app.include_router(stats.ROUTER)
+    app.include_router(admin.ROUTER)
+    Instrumentator().instrument(app).expose(app)
+    return app
 
 
+@click.command()
+@click.option('--seed/--no-seed', default=False)
+@click.option('--db-path', required=True)
+@click.option('--db-echo/--no-db-echo', default=False)
+@click.option('--db-wipe-on-start/--no-db-wipe-on-start', default=False)
+@click.option('--db-read-replica', multiple=True)
+@click.option(
+    '--db-shards/--no-db-shards',
+    default=False,
+    help='keep posts, comments and tagged posts in a file of their own',
+)
+@click.option('--db-read-your-writes', default=0.0)
+@click.option('--write-batch-size', default=1)
+@click.option('--write-batch-delay-ms', default=5.0)
+@click.option('--cache-size', default=1024)
+@click.option('--max-concurrent-reads', default=0, help='0 means unlimited')
+@click.option('--max-queued-reads', default=64)
+@click.option('--max-concurrent-writes', default=0, help='0 means unlimited')
+@click.option('--max-queued-writes', default=16)
+@click.option('--admission-timeout', default=5.0)
+@click.option('--coalesce-reads/--no-coalesce-reads', default=False)
+@click.option(
+    '--threads', default=40, help='worker threads for sync routes; also the DB pool size',
+)
+@click.option('--hash-workers', default=2, help='threads for password hashing')
+@click.option(
+    '--max-queued-hashes',
+    default=8,
+    help='capped so hashes use at most a quarter of --threads',
+)
+@click.option('--admin-token', envvar='API_ADMIN_TOKEN', default=None)
+@click.option('--profile-dir', default='profiles')
+@click.option(
+    '--profile-sample-rate', default=0.0, help='fraction of requests to profile',
+)
+@click.option('--slow-query-ms', default=100.0, help='0 disables the slow query log')
+@click.option('--archive-after-days', default=0.0, help='0 disables archiving')
+@click.option('--archive-every', default=3600.0, help='seconds between archive runs')
+@click.option('--archive-batch-size', default=500)
+@click.option(
+    '--maintenance/--no-maintenance',
+    'run_maintenance',
+    default=True,
+    help='SQLite housekeeping; scheduled backups run either way',
+)
+@click.option(
+    '--maintenance-window', default=None, help='e.g. 02:00-05:00 (local time)',
+)
+@click.option('--backup-dir', default=None, help='enables /admin/backups')
+@click.option(
+    '--backup-every', default=24.0, help='hours between scheduled backups, 0 for none',
+)
+@click.option('--backup-keep', default=7)
+@click.option('--log-level', default='INFO')
+@click.option(
+    '--log-level-for', multiple=True, help='logger=LEVEL, e.g. api.models=DEBUG',
+)
+@click.option('--log-debug-sample', default=1.0, help='fraction of DEBUG records kept')
+async def start(
+    seed,
+    db_path,
+    db_echo,
+    db_wipe_on_start,
+    db_read_replica,
+    db_shards,
+    db_read_your_writes,
+    write_batch_size,
+    write_batch_delay_ms,
+    cache_size,
+    max_concurrent_reads,
+    max_queued_reads,
+    max_concurrent_writes,
+    max_queued_writes,
+    admission_timeout,
+    coalesce_reads,
+    threads,
+    hash_workers,
+    max_queued_hashes,
+    admin_token,
+    profile_dir,
+    profile_sample_rate,
+    slow_query_ms,
+    archive_after_days,
+    archive_every,
+    archive_batch_size,
+    run_maintenance,
+    maintenance_window,
+    backup_dir,
+    backup_every,
+    backup_keep,
+    log_level,
+    log_level_for,
+    log_debug_sample,
+):
+    log_listener = log.setup(
+        log_level,
+        [tuple(spec.split('=', 1)) for spec in log_level_for],
+        debug_sample=log_debug_sample,
+    )
+    concurrency.configure_threads(threads)
+    credentials.configure(hash_workers, max_queued_hashes, threads=threads)
+    admin.configure(admin_token)
+    app = create_app(
+        profile=bool(admin_token or profile_sample_rate),
+        profile_dir=Path(profile_dir),
+        profile_sample_rate=profile_sample_rate,
+        max_concurrent_reads=max_concurrent_reads,
+        max_queued_reads=max_queued_reads,
+        max_concurrent_writes=max_concurrent_writes,
+        max_queued_writes=max_queued_writes,
+        admission_timeout=admission_timeout,
+        coalesce_reads=coalesce_reads,
+        # see SingleFlightMiddleware
+        coalesce_per_client=bool(db_read_your_writes),
+        route_context=bool(slow_query_ms),
+    )
+
     db = Path(db_path)
-    engine = create_engine(f"sqlite:///{db}", echo=db_echo)
+    engine = create_engine(
+        f"sqlite:///{db}", echo=db_echo, **concurrency.engine_kwargs(threads),
+    )
+    shard_files = shards.files(db) if db_shards else {}
     if db_wipe_on_start:
-        db.unlink(missing_ok=True)
-    Endpointer.init(engine, do_seed=False)
+        for file in (db, *shard_files.values()):
+            for suffix in ("", "-wal", "-shm"):
+                file.with_name(file.name + suffix).unlink(missing_ok=True)
+    shards.attach(engine, shard_files)
+    maintenance.enable_incremental_vacuum(engine)
+    maintenance.enable_wal(engine)
+    read_engines = []
+    for i, replica in enumerate(map(Path, db_read_replica)):
+        read_engine = create_engine(
+            f"sqlite:///file:{replica}?mode=ro&uri=true",
+            echo=db_echo,
+            **concurrency.engine_kwargs(threads, f"replica-{i}"),
+        )
+        shards.attach(
+            read_engine, shards.files(replica) if db_shards else {}, read_only=True,
+        )
+        read_engines.append(read_engine)
+    if slow_query_ms:
+        slowlog.SLOW_QUERIES.threshold = slow_query_ms / 1000
+        for logged in {engine, *read_engines}:
+            slowlog.SLOW_QUERIES.install(logged)
+    coalescer = (
+        WriteCoalescer(
+            engine,
+            max_batch=write_batch_size,
+            max_delay=write_batch_delay_ms / 1000,
+        )
+        if write_batch_size > 1
+        else None
+    )
+    Endpointer.init(engine, shards=shard_files, do_seed=False)
+    db = Endpointer.connect(
+        app,
+        engine,
+        read_engines=read_engines,
+        read_your_writes=db_read_your_writes,
+        coalescer=coalescer,
+        cache_size=cache_size,
+    )
     config = uvicorn.Config(app, host="0.0.0.0", port=8000)
     server = uvicorn.Server(config)
     if seed:
         asyncio.create_task(do_seed(server))
-    await server.serve()
+    background = [asyncio.create_task(concurrency.probe_thread_wait())]
+    if archive_after_days:
+        background.append(asyncio.create_task(archive.run(
+            db,
+            timedelta(days=archive_after_days),
+            every=archive_every,
+            batch_size=archive_batch_size,
+        )))
+    tasks = maintenance.default_tasks() if run_maintenance else []
+    if backup_dir:
+        backup.BACKUPS = backup.Backups(engine, Path(backup_dir), keep=backup_keep)
+        if backup_every:
+            tasks.append(
+                maintenance.Task("backup", backup_every * 3600, backup.BACKUPS.task),
+            )
+    if tasks:
+        scheduler = maintenance.Scheduler(
+            engine, tasks, window=maintenance.parse_window(maintenance_window),
+        )
+        background.append(asyncio.create_task(scheduler.run()))
+    try:
+        await server.serve()
+    finally:
+        for task in background:
+            task.cancel()
+        log_listener.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from datetime import time as clock
+from typing import TYPE_CHECKING, Any, Callable, Iterable
+
+import anyio
+import anyio.to_thread
+from prometheus_client import Counter, Gauge, Histogram
+
+if TYPE_CHECKING:
+    from sqlalchemy.future import Engine as SQLAlchemyEngine
+
+LOG = logging.getLogger(__name__)
+
+# Maintenance gives up on a lock after this long rather than queueing in
+# front of API writes; pysqlite's own default (restored afterwards) is 5s.
+BUSY_TIMEOUT_MS = 50
+DEFAULT_BUSY_TIMEOUT_MS = 5000
+VACUUM_STEP = 256  # pages per incremental_vacuum, between idle checks
+ANALYSIS_LIMIT = 1000  # rows sampled per index by ANALYZE
+
+DURATION = Histogram("api_maintenance_seconds", "Maintenance task duration", ["task"])
+RUNS = Counter("api_maintenance_runs", "Maintenance task runs", ["task", "outcome"])
+LAST_SUCCESS = Gauge(
+    "api_maintenance_last_success_timestamp", "When a task last succeeded", ["task"],
+)
+
+Idle = Callable[[], bool]
+
+
+def optimize(conn: sqlite3.Connection, idle: Idle) -> str:  # noqa: ARG001
+    conn.execute("PRAGMA optimize")
+    return "ok"
+
+
+def analyze(conn: sqlite3.Connection, idle: Idle) -> str:  # noqa: ARG001
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    conn.execute("ANALYZE")
+    return "ok"
+
+
+def checkpoint(conn: sqlite3.Connection, idle: Idle) -> str:  # noqa: ARG001
+    # PASSIVE never waits for readers or writers
+    busy, log, _ = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+    if log == -1:
+        return "skipped"  # not in WAL mode
+    return "busy" if busy else "ok"
+
+
+def incremental_vacuum(conn: sqlite3.Connection, idle: Idle) -> str:
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:  # noqa: PLR2004
+        return "skipped"  # see enable_incremental_vacuum
+    while conn.execute("PRAGMA freelist_count").fetchone()[0]:
+        if not idle():
+            return "yielded"
+        conn.execute(f"PRAGMA incremental_vacuum({VACUUM_STEP})").fetchall()
+    return "ok"
+
+
+def enable_incremental_vacuum(engine: SQLAlchemyEngine) -> None:
+    """Make a new database file give pages back with incremental_vacuum.
+
+    Only takes effect before the first table is created; for an existing
+    file it is a no-op and the vacuum task is skipped.
+    """
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+
+
+def enable_wal(engine: SQLAlchemyEngine) -> None:
+    """Put the database file, and the shards attached to it, in WAL mode.
+
+    Readers then neither wait for the writer nor block it, and the
+    wal_checkpoint task has a log to checkpoint. The mode is stored in the
+    file; setting it again is a no-op.
+    """
+    with engine.connect() as conn:
+        for _, schema, _ in conn.exec_driver_sql("PRAGMA database_list").all():
+            if schema != "temp":
+                conn.exec_driver_sql(f'PRAGMA "{schema}".journal_mode = WAL')
+
+
+@dataclass
+class Task:
+    name: str
+    every: float
+    run: Callable[[sqlite3.Connection, Idle], str]
+    # heavier tasks wait for the maintenance window, if one is set
+    in_window_only: bool = False
+    last: float = float("-inf")
+
+
+def default_tasks() -> list[Task]:
+    return [
+        Task("wal_checkpoint", 300, checkpoint),
+        Task("optimize", 3600, optimize),
+        Task("analyze", 86400, analyze, in_window_only=True),
+        Task("incremental_vacuum", 86400, incremental_vacuum, in_window_only=True),
+    ]
+
+
+def parse_window(window: str | None) -> tuple[clock, clock] | None:
+    """``"02:00-05:00"`` to a pair of times; the window may wrap midnight."""
+    if not window:
+        return None
+    start, end = window.split("-")
+    return clock.fromisoformat(start), clock.fromisoformat(end)
+
+
+class Scheduler:
+    """Run SQLite housekeeping on the primary between API requests.
+
+    Due tasks only start when no sync route is running, and run one at a
+    time on their own thread. They hold locks only briefly: a short busy
+    timeout makes them give up rather than wait behind API writes, and the
+    incremental vacuum stops between steps once requests come in. Given a
+    ``window``, tasks marked ``in_window_only`` run only inside it.
+    """
+
+    def __init__(
+        self: Scheduler,
+        engine: SQLAlchemyEngine,
+        tasks: Iterable[Task] | None = None,
+        *,
+        window: tuple[clock, clock] | None = None,
+        tick: float = 10.0,
+    ) -> None:
+        self.engine = engine
+        self.tasks = list(default_tasks() if tasks is None else tasks)
+        self.window = window
+        self.tick = tick
+        self._limiter: Any = None
+
+    def in_window(self: Scheduler, now: datetime) -> bool:
+        if self.window is None:
+            return True
+        start, end = self.window
+        if start <= end:
+            return start <= now.time() < end
+        return now.time() >= start or now.time() < end
+
+    def idle(self: Scheduler) -> bool:
+        return self._limiter is None or self._limiter.borrowed_tokens == 0
+
+    def due(self: Scheduler, now: float) -> list[Task]:
+        in_window = self.in_window(datetime.now())  # noqa: DTZ005
+        return [
+            task
+            for task in self.tasks
+            if now - task.last >= task.every and (in_window or not task.in_window_only)
+        ]
+
+    def run_task(self: Scheduler, task: Task) -> str:
+        task.last = time.monotonic()
+        raw = self.engine.raw_connection()
+        start = time.perf_counter()
+        try:
+            raw.driver_connection.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            outcome = task.run(raw.driver_connection, self.idle)
+        except sqlite3.OperationalError as e:
+            outcome = "busy" if "locked" in str(e) else "error"
+            if outcome == "error":
+                LOG.exception("maintenance task failed", extra={"task": task.name})
+        except Exception:
+            outcome = "error"
+            LOG.exception("maintenance task failed", extra={"task": task.name})
+        finally:
+            raw.driver_connection.execute(
+                f"PRAGMA busy_timeout = {DEFAULT_BUSY_TIMEOUT_MS}",
+            )
+            raw.close()
+        duration = time.perf_counter() - start
+        DURATION.labels(task.name).observe(duration)
+        RUNS.labels(task.name, outcome).inc()
+        if outcome == "ok":
+            LAST_SUCCESS.labels(task.name).set_to_current_time()
+        LOG.info(
+            "maintenance",
+            extra={"task": task.name, "outcome": outcome, "duration": round(duration, 6)},
+        )
+        return outcome
+
+    async def run(self: Scheduler) -> None:
+        self._limiter = anyio.to_thread.current_default_thread_limiter()
+        # not the default limiter, so maintenance never counts as traffic
+        own = anyio.CapacityLimiter(1)
+        while True:
+            await asyncio.sleep(self.tick)
+            for task in self.due(time.monotonic()):
+                if not self.idle():
+                    break
+                await anyio.to_thread.run_sync(self.run_task, task, limiter=own)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import inspect
+import logging
 import warnings
 from datetime import datetime  # noqa: TCH003
 from typing import (
@@ -10,33 +11,65 @@ from typing import (
     Callable,
     ClassVar,
     Generator,
+    Generic,
     Protocol,
+    Sequence,
     TypeVar,
 )
 
 import sqlalchemy
-from fastapi import APIRouter, Depends, FastAPI, HTTPException
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.exc import SAWarning
+from pydantic import BaseModel, model_serializer
 from sqlmodel import (
     Field,
     Session,
     SQLModel,
+    create_engine,
     func,
     select,
 )
 
+from . import credentials, events
+from .cache import LookupCache
+from .db import Database, client_key
+from .loaders import CHUNK_SIZE, group_by, index_by
+from .profiling import ProfiledRoute
+
 # SQLModelMetaclass
-from .utils import SORT, sort_factory
+from .utils import (
+    FILTER,
+    INCLUDE,
+    SORT,
+    FilterSet,
+    archived_factory,
+    include_factory,
+    index_orders,
+    index_servable,
+    sort_factory,
+)
 
 if TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
     from enum import Enum
+    from pathlib import Path
 
     from mypy_extensions import DefaultNamedArg, NamedArg
     from sqlalchemy.future import Engine as SQLAlchemyEngine
     from sqlmodel.sql.expression import SelectOfScalar
 
+    from .coalesce import WriteCoalescer
+
 warnings.filterwarnings("ignore", category=SAWarning)
 
+LOG = logging.getLogger(__name__)
+
+
+def database(request: Request) -> Database:
+    """The database of the app serving ``request``, see ``Endpointer.connect``."""
+    return request.app.state.db
+
 
 def pagination(skip: int = 0, limit: int | None = None) -> dict[str, int | None]:
     return {"skip": skip, "limit": limit}
@@ -61,16 +94,19 @@ class ElemNotFoundException(HTTPException):
 
 ID_FIELD = Field(primary_key=True, index=True, default=None)
 
-USER_ID_FIELD = Field(foreign_key="user.id")
+USER_ID_FIELD = Field(foreign_key="user.id", index=True)
 TAG_ID_PRIMARY_FIELD = Field(foreign_key="tag.id", primary_key=True)
 POST_ID_PRIMARY_FIELD = Field(foreign_key="post.id", primary_key=True)
 POST_ID_FIELD = Field(foreign_key='post.id')
 
-CREATED_AT_FIELD = Field(default=None, sa_column_kwargs={"default": func.now()})
+CREATED_AT_FIELD = Field(
+    default=None, index=True, sa_column_kwargs={"default": func.now()},
+)
 UPDATED_AT_FIELD = Field(
     default=None,
     sa_column_kwargs={"default": func.now(), "onupdate": func.now()},
 )
+COUNTER_FIELD = Field(default=0, index=True, sa_column_kwargs={"server_default": "0"})
 
 
 class ConfirmationModel(SQLModel):
@@ -78,15 +114,46 @@ class ConfirmationModel(SQLModel):
 
 
 M = TypeVar("M", bound=SQLModel, covariant=True)
+R = TypeVar("R")
 T = TypeVar("T")
 
+# Ids per batch_get request; they are loaded CHUNK_SIZE at a time.
+MAX_BATCH_IDS = 1000
+
+
+class BatchGetRequest(SQLModel):
+    ids: list[int]
+
+
+class BatchGetResult(BaseModel, Generic[R]):
+    items: list[R]
+    missing: list[int]
+
 
 class Endpointer(Protocol):
-    ROUTER: ClassVar[APIRouter] = APIRouter()
     prefix: ClassVar[str]
     SEED_OBJS: ClassVar[tuple[dict[str, Any]] | tuple[()]]
 
-    engine: ClassVar[SQLAlchemyEngine]
+    # keep a LookupCache of the rows per database, see lookup_many()
+    CACHED: ClassVar[bool] = False
+
+    # field -> filter operators allowed on it, see utils.FilterSet
+    FILTERS: ClassVar[dict[str, tuple[str, ...]]] = {}
+    FILTER_ALIASES: ClassVar[dict[str, str]] = {}
+    ALLOW_SCAN: ClassVar[frozenset[str]] = frozenset()
+    SCAN_WITH_INDEX: ClassVar[frozenset[str]] = frozenset()
+    # query parameters get_all applies itself (in query_apply) with an index
+    INDEXED_PARAMS: ClassVar[tuple[str, ...]] = ()
+    # relations the read routes can embed with ?include=
+    INCLUDES: ClassVar[tuple[str, ...]] = ()
+    # column whose age moves rows to the archive table, see archive()
+    ARCHIVE_BY: ClassVar[str | None] = None
+    # foreign key column: rows move to the archive table together with the
+    # row it points to
+    ARCHIVE_WITH: ClassVar[str | None] = None
+    # database file the tables live in when sharded, see shards.py; tables
+    # that triggers connect must share one
+    SHARD: ClassVar[str | None] = None
 
     class Table(SQLModel):
         pass
@@ -111,9 +178,10 @@ class Endpointer(Protocol):
         my_f_path = my_f.__qualname__
         f_origin_class_name = my_f_path.split(".")[0]
         if cls.__name__ == f_origin_class_name:  # is original superclass
+            router = APIRouter(route_class=ProfiledRoute)
             for subclass in cls.__subclasses__():
-                subclass.include_endpoints(app)
-            app.include_router(cls.ROUTER)
+                subclass.include_endpoints(router)
+            app.include_router(router)
         else:                                    # is inheriting subclass
             cls.endpointed_init(app)
 
@@ -122,20 +190,200 @@ class Endpointer(Protocol):
         cls: type[Endpointer],
         engine: SQLAlchemyEngine,
         *,
+        shards: Mapping[str, Path] | None = None,
         do_seed: bool = False,
     ) -> None:
-        cls.engine = engine
-        SQLModel.metadata.create_all(bind=cls.engine)
+        """Create the schema on ``engine``, and seed it if ``do_seed``.
+
+        The tables of subclasses whose ``SHARD`` is in ``shards`` are created
+        in that file instead, which ``engine`` should have attached (see
+        ``shards.attach``).
+        """
+        placed: dict[Path | None, list[type[Endpointer]]] = {}
+        for subclass in Endpointer.__subclasses__():
+            subclass.archive_table()
+            file = shards.get(subclass.SHARD) if shards and subclass.SHARD else None
+            placed.setdefault(file, []).append(subclass)
+        for file, subclasses in placed.items():
+            if file is not None:
+                cls.check_not_in_main(engine, file, subclasses)
+        for file, subclasses in placed.items():
+            target = engine if file is None else create_engine(f"sqlite:///{file}")
+            tables = [t for s in subclasses for t in s.tables()]
+            SQLModel.metadata.create_all(bind=target, tables=tables)
+            with target.begin() as conn:
+                for subclass in subclasses:
+                    subclass.migrate(conn)
+                # create_all skips tables that exist, with their indexes
+                for table in tables:
+                    for index in table.indexes:
+                        index.create(conn, checkfirst=True)
+                for subclass in subclasses:
+                    for statement in subclass.ddl():
+                        conn.exec_driver_sql(statement)
+            if target is not engine:
+                target.dispose()
         if do_seed:
             for subclass in Endpointer.__subclasses__():
-                subclass.seed()
+                subclass.seed(engine)
+
+    @classmethod
+    def connect(
+        cls: type[Endpointer],
+        app: FastAPI,
+        engine: SQLAlchemyEngine,
+        *,
+        read_engines: Iterable[SQLAlchemyEngine] = (),
+        read_your_writes: float = 0.0,
+        coalescer: WriteCoalescer | None = None,
+        cache_size: int = 1024,
+    ) -> Database:
+        """Point the routes of ``app`` at ``engine``, without touching the schema.
+
+        ``engine`` may also be a Connection, e.g. one inside a test
+        transaction. The lookup caches start out filled from it.
+        """
+        db = Database(
+            engine,
+            read_engines,
+            read_your_writes=read_your_writes,
+            coalescer=coalescer,
+        )
+        for subclass in Endpointer.__subclasses__():
+            if subclass.CACHED:
+                db.caches[subclass.prefix] = subclass.warm_cache(engine, cache_size)
+        app.state.db = db
+        return db
+
+    @classmethod
+    def warm_cache(
+        cls: type[Endpointer], engine: SQLAlchemyEngine, maxsize: int,
+    ) -> LookupCache:
+        cache = LookupCache(maxsize)
+        with Session(engine) as session:
+            rows = session.exec(cls.select().limit(maxsize)).all()
+            cache.put_many(
+                {getattr(row, cls.get_pk()): cls.detached(row) for row in rows},
+            )
+        return cache
+
+    @classmethod
+    def cache(cls: type[Endpointer], db: Database | None) -> LookupCache | None:
+        return None if db is None else db.caches.get(cls.prefix)
+
+    @classmethod
+    def detached(cls, obj: Table) -> Table:
+        return cls.Table.model_validate(obj.model_dump())
+
+    @classmethod
+    def lookup_many(cls, session: Session, ids: Iterable[Any]) -> dict[Any, Table]:
+        """Rows by primary key, served from the cache of ``session``'s database.
+
+        Sessions from ``get_db``/``get_read_db`` carry their Database in
+        ``session.info``; others are served uncached.
+        """
+        if (cache := cls.cache(session.info.get("db"))) is None:
+            return index_by(session, cls.pk_column(), ids)
+        found, missing = cache.get_many({id_ for id_ in ids if id_ is not None})
+        if missing:
+            stamp = cache.stamp()
+            loaded = {
+                id_: cls.detached(row)
+                for id_, row in index_by(session, cls.pk_column(), missing).items()
+            }
+            # a replica may lag the primary, so only fill from the latter
+            if not session.info.get("replica"):
+                cache.put_many(loaded, stamp)
+            found |= loaded
+        return found
+
+    @classmethod
+    def ddl(cls: type[Endpointer]) -> tuple[str, ...]:
+        """Extra idempotent DDL (triggers etc.) run by ``init`` after create_all."""
+        return ()
+
+    @classmethod
+    def migrate(cls: type[Endpointer], conn: sqlalchemy.Connection) -> None:
+        """Bring a table created by an older version up to date, see ``init``."""
+        table = cls.Table.__table__  # type: ignore[attr-defined]
+        if table.dialect_options["sqlite"]["autoincrement"]:
+            cls.add_autoincrement(conn)
+
+    @classmethod
+    def add_autoincrement(cls: type[Endpointer], conn: sqlalchemy.Connection) -> None:
+        """Rebuild the table if it was created without AUTOINCREMENT.
+
+        Without it SQLite hands the highest id out again once that row is
+        gone, archived rows included. SQLite can't add it to a table, so the
+        rows are copied into a new one. The old table's indexes go with it;
+        ``init`` creates them again right after.
+        """
+        table = cls.Table.__table__  # type: ignore[attr-defined]
+        created = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (table.name,),
+        ).scalar_one()
+        if "AUTOINCREMENT" in created.upper():
+            return
+        name = conn.dialect.identifier_preparer.format_table(table)
+        new = f"{table.name}__new"
+        create = str(sqlalchemy.schema.CreateTable(table).compile(conn))
+        conn.exec_driver_sql(create.replace(f"TABLE {name} ", f"TABLE {new} ", 1))
+        columns = ", ".join(table.columns.keys())
+        conn.exec_driver_sql(f"INSERT INTO {new} ({columns}) SELECT {columns} FROM {name}")
+        conn.exec_driver_sql(f"DROP TABLE {name}")
+        # Triggers on other tables still name the dropped table; don't let
+        # the rename check them.
+        conn.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+        try:
+            conn.exec_driver_sql(f"ALTER TABLE {new} RENAME TO {name}")
+        finally:
+            conn.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+        # ids already handed out twice stay that way; new ones start above
+        # the archived ones too
+        pk = cls.get_pk()
+        highest = max(
+            conn.execute(select(func.max(t.c[pk]))).scalar() or 0
+            for t in cls.tables()
+        )
+        conn.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = ?", (table.name,))
+        conn.exec_driver_sql(
+            "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table.name, highest),
+        )
+        LOG.info("added autoincrement", extra={"table": table.name, "seq": highest})
 
     @classmethod
-    def get_db(cls: type[Endpointer]) -> Generator[Session, None, None]:
-        session = Session(cls.engine)
+    def get_db(
+        cls: type[Endpointer], request: Request,
+    ) -> Generator[Session, None, None]:
+        # Written rows come back from RETURNING fully loaded; don't expire
+        # them on commit just to SELECT them again while serializing.
+        db = database(request)
+        session = Session(db.writer, expire_on_commit=False, info={"db": db})
         try:
             yield session
             session.commit()
+            db.wrote(client_key(request))
+        finally:
+            session.close()
+
+    @classmethod
+    def get_read_db(
+        cls: type[Endpointer], request: Request,
+    ) -> Generator[Session, None, None]:
+        # Nothing is ever written through a read session, so there is nothing
+        # to flush, commit or expire; closing just ends the (deferred, and
+        # for pysqlite never explicitly begun) transaction.
+        db = database(request)
+        reader = db.reader(client_key(request))
+        session = Session(
+            reader,
+            autoflush=False,
+            expire_on_commit=False,
+            info={"db": db, "replica": reader is not db.writer},
+        )
+        try:
+            yield session
         finally:
             session.close()
 
@@ -143,6 +391,17 @@ class Endpointer(Protocol):
     def obj_apply(cls, obj: Table, session: Session) -> Table:
         return obj
 
+    @classmethod
+    def objs_apply(
+        cls,
+        objs: Sequence[Table],
+        session: Session,
+        include: INCLUDE = frozenset(),
+        *,
+        include_archived: bool = False,
+    ) -> list[Table]:
+        return [cls.obj_apply(obj, session) for obj in objs]
+
     @classmethod
     def get_tags(cls: type[Endpointer]) -> list[str | Enum]:
         return [cls.prefix.replace("_", " ")]
@@ -157,6 +416,139 @@ class Endpointer(Protocol):
         return select(cls.Table)
 
 
+    @staticmethod
+    def check_not_in_main(
+        engine: SQLAlchemyEngine, file: Path, subclasses: list[type[Endpointer]],
+    ) -> None:
+        """Refuse to shard a database whose main file already has the tables.
+
+        Unqualified names resolve to the main database first, so its tables
+        would keep being used and the shard's silently ignored.
+        """
+        names = [t.name for s in subclasses for t in s.tables()]
+        with engine.connect() as conn:
+            found = conn.execute(
+                sqlalchemy.text(
+                    "SELECT name FROM main.sqlite_master"
+                    " WHERE type = 'table' AND name IN :names",
+                ).bindparams(sqlalchemy.bindparam("names", expanding=True)),
+                {"names": names},
+            ).scalars().all()
+        if found:
+            raise RuntimeError(
+                f"{', '.join(sorted(found))} already exist in the main database;"
+                f" move them to {file} before sharding",
+            )
+
+    @classmethod
+    def tables(cls) -> list[sqlalchemy.Table]:
+        table = cls.Table.__table__  # type: ignore[attr-defined]
+        archive = cls.archive_table()
+        return [table] if archive is None else [table, archive]
+
+    @classmethod
+    def archive_table(cls) -> sqlalchemy.Table | None:
+        """``<table>_archive``: same columns and indexes, no constraints."""
+        if cls.ARCHIVE_BY is None and cls.ARCHIVE_WITH is None:
+            return None
+        if "_archive_table" not in cls.__dict__:
+            table = cls.Table.__table__  # type: ignore[attr-defined]
+            name = f"{table.name}_archive"
+            cls._archive_table = sqlalchemy.Table(
+                name,
+                SQLModel.metadata,
+                *(
+                    sqlalchemy.Column(column.name, column.type, primary_key=column.primary_key)
+                    for column in table.columns
+                ),
+                *(
+                    sqlalchemy.Index(
+                        f"ix_{name}_{'_'.join(index.columns.keys())}",
+                        *index.columns.keys(),
+                    )
+                    for index in table.indexes
+                ),
+            )
+        return cls._archive_table
+
+    @classmethod
+    def source(cls, include_archived: bool = False) -> Any:  # noqa: FBT001, FBT002
+        """What reads select from: the table, or the table and its archive."""
+        if not include_archived or (archive := cls.archive_table()) is None:
+            return cls.Table
+        table = cls.Table.__table__  # type: ignore[attr-defined]
+        both = sqlalchemy.union_all(
+            sqlalchemy.select(*table.columns),
+            sqlalchemy.select(*(archive.c[name] for name in table.columns.keys())),
+        ).subquery(f"{table.name}_all")
+        return sqlalchemy.orm.aliased(cls.Table, both)
+
+    @classmethod
+    def archive(
+        cls, session: Session, cutoff: datetime, batch_size: int = CHUNK_SIZE,
+    ) -> int:
+        """Move up to ``batch_size`` of the oldest rows from before ``cutoff``.
+
+        Rows of ``ARCHIVE_WITH`` endpointers pointing to them move along.
+        """
+        table = cls.Table.__table__  # type: ignore[attr-defined]
+        pk = cls.pk_column()
+        age = getattr(cls.Table, cls.ARCHIVE_BY)
+        ids = session.exec(
+            select(pk)
+            .where(age < sqlalchemy.literal(cutoff.isoformat(" "), sqlalchemy.String))
+            .order_by(age)
+            .limit(batch_size),
+        ).all()
+        if not ids:
+            return 0
+        cls.move_to_archive(session, table.c[pk.key].in_(ids))
+        for dependent in Endpointer.__subclasses__():
+            if dependent.ARCHIVE_WITH is None:
+                continue
+            column = dependent.Table.__table__.c[dependent.ARCHIVE_WITH]  # type: ignore[attr-defined]
+            if any(fk.column.table is table for fk in column.foreign_keys):
+                dependent.move_to_archive(session, column.in_(ids))
+        if (cache := cls.cache(session.info.get("db"))) is not None:
+            for id_ in ids:
+                cache.invalidate(id_)
+        return len(ids)
+
+    @classmethod
+    def move_to_archive(cls, session: Session, where: Any) -> None:
+        table = cls.Table.__table__  # type: ignore[attr-defined]
+        session.execute(
+            sqlalchemy.insert(cls.archive_table()).from_select(
+                table.columns.keys(), sqlalchemy.select(*table.columns).where(where),
+            ),
+        )
+        session.execute(
+            sqlalchemy.delete(table).where(where),
+            execution_options={"synchronize_session": False},
+        )
+
+    @classmethod
+    def get_archived(cls, session: Session, obj_id: Any) -> Table | None:
+        if (archive := cls.archive_table()) is None:
+            return None
+        entity = sqlalchemy.orm.aliased(cls.Table, archive, adapt_on_names=True)
+        return session.exec(
+            select(entity).where(getattr(entity, cls.get_pk()) == obj_id),
+        ).first()
+
+    @classmethod
+    def filter_set(cls) -> FilterSet:
+        if "_filter_set" not in cls.__dict__:
+            cls._filter_set = FilterSet(
+                cls.Table,
+                cls.FILTERS,
+                cls.FILTER_ALIASES,
+                allow_scan=cls.ALLOW_SCAN,
+                scan_with_index=cls.SCAN_WITH_INDEX,
+                indexed_params=cls.INDEXED_PARAMS,
+            )
+        return cls._filter_set
+
     @classmethod
     def query_apply(
         cls, query: SelectOfScalar[Table], *args: Any, **kwargs: Any,
@@ -170,29 +562,78 @@ class Endpointer(Protocol):
         return query.offset(pagination["skip"]).limit(pagination["limit"])
 
     @classmethod
-    def sort(cls, query: SelectOfScalar[Table], sort_: SORT) -> SelectOfScalar[Table]:
-        if sort_:
-            field = getattr(cls.Table, sort_.get("sort", cls.get_pk()))
-            order = field.desc() if sort_.get("reverse", False) else field
-            return query.order_by(order)
-        return query
+    def sort(
+        cls, query: SelectOfScalar[Table], sort_: SORT, filters: FILTER = (),
+    ) -> SelectOfScalar[Table]:
+        # the primary key breaks ties, so pages are stable; it is unique, so
+        # only its direction matters when it follows other fields, and it
+        # takes theirs, as an index can't be scanned in mixed directions
+        pk = cls.Table.__table__.primary_key.columns.keys()  # type: ignore[attr-defined]
+        descending = sort_[0][1] if sort_ else False
+        keys = [
+            (field, descending if i and field in pk else desc)
+            for i, (field, desc) in enumerate(sort_)
+        ]
+        keys += [(column, descending) for column in pk if column not in dict(keys)]
+        fixed = {condition.field for condition in filters if condition.op == "eq"}
+        if sort_ and not index_servable(
+            keys, index_orders(cls.Table.__table__), fixed,  # type: ignore[attr-defined]
+        ):
+            raise HTTPException(
+                status_code=422,
+                detail=f"No index serves sort={','.join(('-' if d else '') + f for f, d in keys)}",
+            )
+        entity = query.column_descriptions[0]["entity"]
+        return query.order_by(
+            *(
+                getattr(entity, field).desc() if desc else getattr(entity, field)
+                for field, desc in keys
+            ),
+        )
 
     @classmethod
     def create(
         cls,
     ) -> Callable[[DefaultNamedArg(Session, "session"), NamedArg(Any, "obj")], Table]:
         def route(
-            *, session: Session = Depends(cls.get_db), obj: Endpointer.Creator,
+            *,
+            session: Session = Depends(cls.get_db),
+            db: Database = Depends(database),
+            obj: Endpointer.Creator,
         ) -> Endpointer.Table:
-            db_obj = cls.Table.model_validate(obj)
-            session.add(db_obj)
-            session.commit()
-            session.refresh(db_obj)
+            values = cls.write_values(obj.model_dump(exclude_unset=True))
+            if db.coalescer is not None:
+                db_obj = db.coalescer.submit(
+                    lambda coalesced: cls.insert(coalesced, values),
+                )
+            else:
+                db_obj = cls.insert(session, values)
+                session.commit()
+            cls.publish(db, "created", db_obj.model_dump(mode="json"))
             return db_obj
 
         route.__annotations__["obj"] = cls.Creator
         return route
 
+    @classmethod
+    def write_values(cls, values: dict[str, Any]) -> dict[str, Any]:
+        """Turn validated Creator/Updater values into column values."""
+        return values
+
+    @classmethod
+    def insert(cls, session: Session, values: dict[str, Any]) -> Table:
+        return session.scalars(
+            sqlalchemy.insert(cls.Table).values(values).returning(cls.Table),
+        ).one()
+
+    @classmethod
+    def publish(cls, db: Database, type_: str, data: dict[str, Any]) -> None:
+        db.hub(cls.prefix).publish(type_, data)
+
+    @classmethod
+    def pk_column(cls) -> Any:
+        return getattr(cls.Table, cls.get_pk())
+
     @classmethod
     def _do_get_all(
         cls,
@@ -200,14 +641,19 @@ class Endpointer(Protocol):
         pagination: Pagination,
         sort_: SORT,
         *args: Any,
+        filters: FILTER = (),
+        include: INCLUDE = frozenset(),
+        include_archived: bool = False,  # noqa: FBT001, FBT002
         **kwargs: Any,
     ):
-        query = cls.select()
+        entity = cls.source(include_archived)
+        query = select(entity)
+        query = query.where(*(condition.clause(entity) for condition in filters))
         query = cls.query_apply(query, session=session, *args, **kwargs)
-        query = cls.sort(query, sort_)
+        query = cls.sort(query, sort_, filters)
         query = cls.paginate(query, pagination)
         objs = session.exec(query).all()
-        return [cls.obj_apply(obj, session) for obj in objs]
+        return cls.objs_apply(objs, session, include, include_archived=include_archived)
 
     @classmethod
     def get_all(
@@ -215,11 +661,19 @@ class Endpointer(Protocol):
     ):
         def route(
             *,
-            session: Session = Depends(cls.get_db),
+            session: Session = Depends(cls.get_read_db),
             pagination: Pagination,
-            sort_: SORT = sort_factory(cls.Table)
+            sort_: SORT = sort_factory(cls.Table),
+            filters: FILTER = cls.filter_set().dependency,
+            include_archived: bool = archived_factory(cls.ARCHIVE_BY is not None),
             ):
-            return cls._do_get_all(session=session, pagination=pagination, sort_=sort_)
+            return cls._do_get_all(
+                session=session,
+                pagination=pagination,
+                sort_=sort_,
+                filters=filters,
+                include_archived=include_archived,
+            )
 
         return route
 
@@ -231,15 +685,43 @@ class Endpointer(Protocol):
     ]:
         def route(
             *,
-            session: Session = Depends(cls.get_db),
+            session: Session = Depends(cls.get_read_db),
             obj_id: int,
+            include_archived: bool = archived_factory(cls.ARCHIVE_BY is not None),
         ) -> Endpointer.Table:
-            if not (obj := session.get(cls.Table, obj_id)):
+            obj = session.get(cls.Table, obj_id)
+            if obj is None and include_archived:
+                obj = cls.get_archived(session, obj_id)
+            if obj is None:
                 raise ElemNotFoundException(cls.__name__, obj_id)
             return cls.obj_apply(obj, session)
 
         return route
 
+    @classmethod
+    def batch_get(cls) -> Callable[..., dict[str, Any]]:
+        def route(
+            *,
+            session: Session = Depends(cls.get_read_db),
+            body: BatchGetRequest,
+            include: INCLUDE = include_factory(cls.INCLUDES),
+        ) -> dict[str, Any]:
+            ids = list(dict.fromkeys(body.ids))
+            if len(ids) > MAX_BATCH_IDS:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"At most {MAX_BATCH_IDS} ids per request",
+                )
+            found = cls.lookup_many(session, ids)
+            return {
+                "items": cls.objs_apply(
+                    [found[id_] for id_ in ids if id_ in found], session, include,
+                ),
+                "missing": [id_ for id_ in ids if id_ not in found],
+            }
+
+        return route
+
     @classmethod
     def update(
         cls,
@@ -254,18 +736,27 @@ class Endpointer(Protocol):
         def route(
             *,
             session: Session = Depends(cls.get_db),
+            db: Database = Depends(database),
             obj_id: int,
             obj: Endpointer.Table,
         ) -> Endpointer.Table:
-            if not (db_obj := session.get(cls.Table, obj_id)):
+            obj_data = cls.write_values(obj.model_dump(exclude_unset=True))
+            if obj_data:
+                db_obj = session.scalars(
+                    sqlalchemy.update(cls.Table)
+                    .where(cls.pk_column() == obj_id)
+                    .values(obj_data)
+                    .returning(cls.Table),
+                    execution_options={"synchronize_session": False},
+                ).one_or_none()
+            else:
+                db_obj = session.get(cls.Table, obj_id)
+            if db_obj is None:
                 raise ElemNotFoundException(cls.__name__, obj_id)
-
-            obj_data = obj.model_dump(exclude_unset=True)
-            for key, value in obj_data.items():
-                setattr(db_obj, key, value)
-            session.add(db_obj)
             session.commit()
-            session.refresh(db_obj)
+            if (cache := cls.cache(db)) is not None:
+                cache.invalidate(obj_id)
+            cls.publish(db, "updated", db_obj.model_dump(mode="json"))
             return db_obj
 
         route.__annotations__["obj"] = cls.Updater
@@ -278,22 +769,77 @@ class Endpointer(Protocol):
         [DefaultNamedArg(Session, "session"), NamedArg(int, "obj_id")], dict[str, bool],
     ]:
         def route(
-            *, session: Session = Depends(cls.get_db), obj_id: int,
+            *,
+            session: Session = Depends(cls.get_db),
+            db: Database = Depends(database),
+            obj_id: int,
         ) -> dict[str, bool]:
-            if not (obj := session.get(cls.Table, obj_id)):
+            # the whole row, so event subscribers can filter deletions too
+            deleted = session.scalars(
+                sqlalchemy.delete(cls.Table)
+                .where(cls.pk_column() == obj_id)
+                .returning(cls.Table),
+                execution_options={"synchronize_session": False},
+            ).one_or_none()
+            if deleted is None:
                 raise ElemNotFoundException(cls.__name__, obj_id)
-            session.delete(obj)
             session.commit()
+            if (cache := cls.cache(db)) is not None:
+                cache.invalidate(obj_id)
+            cls.publish(db, "deleted", deleted.model_dump(mode="json"))
             return {"ok": True}
 
         return route
 
     @classmethod
-    def include_endpoints(cls, app: FastAPI) -> None:
+    def events(cls) -> Callable[..., Any]:
+        fields = set(cls.Table.model_fields)
+
+        async def route(
+            request: Request,
+            last_event_id: str | None = Header(None),
+        ) -> StreamingResponse:
+            filters = dict(request.query_params)
+            if unknown := filters.keys() - fields:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Cannot filter events on {', '.join(sorted(unknown))}",
+                )
+
+            def matches(event: events.Event) -> bool:
+                return all(
+                    str(event.data.get(field)) == value
+                    for field, value in filters.items()
+                )
+
+            return StreamingResponse(
+                database(request).hub(cls.prefix).stream(
+                    last_event_id, matches, request.is_disconnected,
+                ),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        return route
+
+    @classmethod
+    def include_events(cls, router: APIRouter, tags: list[str | Enum]) -> None:
+        # must come before /{prefix}/{obj_id} so "events" isn't taken for an id
+        router.add_api_route(
+            methods=["GET"],
+            path=f"/{cls.prefix}/events",
+            endpoint=cls.events(),
+            response_class=StreamingResponse,
+            tags=tags,
+            name=f"Stream {tags[0]} changes",
+        )
+
+    @classmethod
+    def include_endpoints(cls, router: APIRouter) -> None:
         tags: list[str | Enum] = cls.get_tags()
 
         # create
-        cls.ROUTER.add_api_route(
+        router.add_api_route(
             methods=["POST"],
             path=f"/{cls.prefix}",
             endpoint=cls.create(),
@@ -303,7 +849,7 @@ class Endpointer(Protocol):
         )
 
         # many
-        cls.ROUTER.add_api_route(
+        router.add_api_route(
             methods=["GET"],
             path=f"/{cls.prefix}",
             endpoint=cls.get_all(),
@@ -312,8 +858,21 @@ class Endpointer(Protocol):
             name=f"Get all {tags[0]}",
         )
 
+        # events
+        cls.include_events(router, tags)
+
+        # batch
+        router.add_api_route(
+            methods=["POST"],
+            path=f"/{cls.prefix}/batch_get",
+            endpoint=cls.batch_get(),
+            response_model=BatchGetResult[getattr(cls, "Reader", cls.Table)],  # type: ignore
+            tags=tags,
+            name=f"Get many {tags[0]} by id",
+        )
+
         # one
-        cls.ROUTER.add_api_route(
+        router.add_api_route(
             methods=["GET"],
             path=f"/{cls.prefix}/{{obj_id}}",
             endpoint=cls.get_one(),
@@ -323,7 +882,7 @@ class Endpointer(Protocol):
         )
 
         # update
-        cls.ROUTER.add_api_route(
+        router.add_api_route(
             methods=["PATCH"],
             path=f"/{cls.prefix}/{{obj_id}}",
             endpoint=cls.update(),
@@ -333,7 +892,7 @@ class Endpointer(Protocol):
         )
 
         # delete
-        cls.ROUTER.add_api_route(
+        router.add_api_route(
             methods=["DELETE"],
             path=f"/{cls.prefix}/{{obj_id}}",
             endpoint=cls.delete(),
@@ -343,20 +902,21 @@ class Endpointer(Protocol):
         )
 
     @classmethod
-    def seed(cls: type[Endpointer]) -> None:
-        with Session(cls.engine) as session:
+    def seed(cls: type[Endpointer], engine: SQLAlchemyEngine) -> None:
+        with Session(engine) as session:
             for obj in cls.SEED_OBJS:
                 create_obj = cls.Creator(**obj)
-                db_obj = cls.Table.model_validate(create_obj)
-                session.add(db_obj)
+                cls.insert(
+                    session, cls.write_values(create_obj.model_dump(exclude_unset=True)),
+                )
                 session.commit()
-                session.refresh(db_obj)
                 # session.delete(db_obj)
                 # session.commit()
 
 
 class User(Endpointer):
     prefix = "users"
+    CACHED = True
 
     SEED_OBJS = ({"name": "User1", "email": "foo@bar.com", "password": "12345"},)
 
@@ -365,7 +925,7 @@ class User(Endpointer):
 
         id: int | None = ID_FIELD
         name: str | None
-        email: str | None
+        email: str | None = Field(index=True)
         password: str | None
 
     class Creator(SQLModel):
@@ -378,14 +938,90 @@ class User(Endpointer):
         email: str | None = None
         password: str | None = None
 
+    class Reader(SQLModel):
+        id: int | None
+        name: str | None
+        email: str | None
+
+    class Login(SQLModel):
+        email: str
+        password: str
+
+    FILTERS = {"email": ("eq",)}
+
+    @classmethod
+    def write_values(cls, values: dict[str, Any]) -> dict[str, Any]:
+        if values.get("password") is not None:
+            values["password"] = credentials.POOL.hash(values["password"])
+        return values
+
+    @classmethod
+    def publish(cls, db: Database, type_: str, data: dict[str, Any]) -> None:
+        data.pop("password", None)
+        super().publish(db, type_, data)
+
+    @classmethod
+    def rehash(cls, session: Session, id_: int, stored: str, password: str) -> None:
+        """Store ``password`` hashed, after it matched a plaintext or weaker hash.
+
+        Only if the user's password is still ``stored``: one changed since
+        it was read is left alone.
+        """
+        hashed = credentials.POOL.hash(password)
+        result = session.exec(
+            sqlalchemy.update(cls.Table)
+            .where(cls.Table.id == id_, cls.Table.password == stored)
+            .values(password=hashed),
+        )
+        if result.rowcount:
+            LOG.info("rehashed password", extra={"user_id": id_})
+
+    @classmethod
+    def login(cls) -> Callable[..., Any]:
+        def route(
+            *,
+            # not a replica: one lagging behind a password change would
+            # still accept the old password, and its rehash undo the change
+            session: Session = Depends(cls.get_db),
+            form: Login,
+        ) -> User.Reader:
+            user = session.exec(
+                select(cls.Table).where(cls.Table.email == form.email),
+            ).first()
+            stored = user.password if user is not None else None
+            if not credentials.POOL.verify(form.password, stored):
+                raise HTTPException(status_code=401, detail="Invalid email or password")
+            if credentials.POOL.needs_rehash(stored):
+                cls.rehash(session, user.id, stored, form.password)
+            return user
+
+        route.__annotations__["form"] = cls.Login
+        return route
+
+    @classmethod
+    def include_endpoints(cls, router: APIRouter) -> None:
+        router.add_api_route(
+            methods=["POST"],
+            path=f"/{cls.prefix}/login",
+            endpoint=cls.login(),
+            response_model=cls.Reader,
+            tags=cls.get_tags(),
+            name="Log in",
+        )
+        super().include_endpoints(router)
+
 
 class TaggedPost(Endpointer):
     prefix = "tagged_posts"
+    SHARD = "posts"
 
     SEED_OBJS = ({"tag_id": 1, "post_id": 1},)
 
     class Table(SQLModel, table=True):
         __tablename__ = "tagged_post"
+        __table_args__ = (
+            sqlalchemy.Index("ix_tagged_post_post_id_tag_id", "post_id", "tag_id"),
+        )
 
         tag_id: int | None = TAG_ID_PRIMARY_FIELD
         post_id: int | None = POST_ID_PRIMARY_FIELD
@@ -398,51 +1034,9 @@ class TaggedPost(Endpointer):
         tag_id: int | None = None
         post_id: int | None = None
 
+    ARCHIVE_WITH = "post_id"
 
-    @classmethod
-    def query_apply(  # type: ignore[override]
-        cls,
-        query: Any,
-        session: Session,
-        tag_id: int | None = None,
-        post_id: int | None = None,
-    ) -> Any:
-        if tag_id:
-            query = query.where(cls.Table.tag_id == tag_id)
-        if post_id:
-            query = query.where(cls.Table.post_id == post_id)
-        return query
-
-
-    @classmethod
-    def get_all(
-        cls,
-    ) -> Callable[
-        [
-            DefaultNamedArg(Session, "session"),
-            NamedArg(dict[str, int | None], "pagination"),
-            DefaultNamedArg(dict[str, str], "sort_"),
-        ],
-        list[Endpointer.Table],
-    ]:
-        def route(
-            *,
-            session: Session = Depends(cls.get_db),
-            pagination: Pagination,
-            sort_: SORT = sort_factory(cls.Table),
-            tag_id: int | None = None,
-            post_id: int | None = None,
-        ) -> list[Endpointer.Table]:
-            return cls._do_get_all(
-                session,
-                pagination,
-                sort_,
-                tag_id=tag_id,
-                post_id=post_id
-            )
-
-        return route
-
+    FILTERS = {"tag_id": ("eq", "in"), "post_id": ("eq", "in")}
 
     @classmethod
     def delete(
@@ -458,29 +1052,32 @@ class TaggedPost(Endpointer):
         def route(
             *,
             session: Session = Depends(cls.get_db),
+            db: Database = Depends(database),
             tag_id: int,
             post_id: int,
         ) -> ConfirmationModel:
-            tagged_post = session.exec(
-                cls.select()
+            deleted = session.scalars(
+                sqlalchemy.delete(cls.Table)
                 .where(
                     cls.Table.tag_id == tag_id,
                     cls.Table.post_id == post_id
                 )
-            ).first()
-            if not tagged_post:
+                .returning(cls.Table.tag_id),
+                execution_options={"synchronize_session": False},
+            ).one_or_none()
+            if deleted is None:
                 raise HTTPException(status_code=404, detail=f'Tagged post with {tag_id=} and {post_id=} not found.')
-            session.delete(tagged_post)
             session.commit()
+            cls.publish(db, "deleted", {"tag_id": tag_id, "post_id": post_id})
             return {'ok': True}
         return route
 
     @classmethod
-    def include_endpoints(cls, app: FastAPI) -> None:
+    def include_endpoints(cls, router: APIRouter) -> None:
         tags: list[str | Enum] = cls.get_tags()
 
         # create
-        cls.ROUTER.add_api_route(
+        router.add_api_route(
             methods=["POST"],
             path=f"/{cls.prefix}",
             endpoint=cls.create(),
@@ -490,7 +1087,7 @@ class TaggedPost(Endpointer):
         )
 
         # many
-        cls.ROUTER.add_api_route(
+        router.add_api_route(
             methods=["GET"],
             path=f"/{cls.prefix}",
             endpoint=cls.get_all(),
@@ -499,8 +1096,11 @@ class TaggedPost(Endpointer):
             name=f"Get all {tags[0]}",
         )
 
+        # events
+        cls.include_events(router, tags)
+
         # delete
-        cls.ROUTER.add_api_route(
+        router.add_api_route(
             methods=["DELETE"],
             path=f"/{cls.prefix}",
             endpoint=cls.delete(),
@@ -512,6 +1112,7 @@ class TaggedPost(Endpointer):
 
 class Tag(Endpointer):
     prefix = "tags"
+    CACHED = True
 
     SEED_OBJS = ({"name": "Tag1"},)
 
@@ -519,7 +1120,7 @@ class Tag(Endpointer):
         __tablename__ = "tag"
 
         id: int | None = ID_FIELD
-        name: str | None
+        name: str | None = Field(index=True)
 
     class Creator(SQLModel):
         name: str
@@ -527,22 +1128,33 @@ class Tag(Endpointer):
     class Updater(SQLModel):
         name: str | None = None
 
+    FILTERS = {"name": ("eq", "prefix")}
+
 
 class Post(Endpointer):
     prefix = "posts"
+    SHARD = "posts"
 
     SEED_OBJS = ({"name": "Post1", "content": "Post1 content", "author": 1},)
 
     class Base(Endpointer.Table):
         id: int | None = ID_FIELD
-        name: str | None
+        name: str | None = Field(index=True)
         content: str | None
-        author: int | None = USER_ID_FIELD
+        # indexed by ix_post_author_created_at
+        author: int | None = Field(foreign_key="user.id")
         created_at: datetime | None = CREATED_AT_FIELD
         updated_at: datetime | None = UPDATED_AT_FIELD
+        comment_count: int = COUNTER_FIELD
+        tag_count: int = COUNTER_FIELD
 
     class Table(Base, table=True):
         __tablename__ = "post"
+        __table_args__ = (
+            sqlalchemy.Index("ix_post_author_created_at", "author", "created_at"),
+            # archived ids must never come back, see add_autoincrement()
+            {"sqlite_autoincrement": True},
+        )
 
     class Creator(SQLModel):
         name: str
@@ -556,28 +1168,190 @@ class Post(Endpointer):
 
     class Reader(Base):
         tags: list[Tag.Table] = []
+        author_user: User.Reader | None = None
+        comments: list[Comment.Table] | None = None
+
+        @model_serializer(mode="wrap")
+        def _drop_not_included(self, handler):  # noqa: ANN001, ANN202
+            data = handler(self)
+            for relation in ("author_user", "comments"):
+                if data.get(relation) is None:
+                    data.pop(relation, None)
+            return data
+
+    # tags are always embedded, as they were before ?include=
+    INCLUDES = ("author", "comments")
+    ARCHIVE_BY = "created_at"
+
+    FILTERS = {
+        "name": ("eq", "prefix"),
+        "author": ("eq", "in"),
+        "created_at": ("lt", "gt"),
+        "updated_at": ("lt", "gt"),
+    }
+    FILTER_ALIASES = {
+        "earliest_created": "created_at__gt",
+        "latest_created": "created_at__lt",
+        "earliest_updated": "updated_at__gt",
+        "latest_updated": "updated_at__lt",
+    }
+    # alone, as before FilterSet; see there
+    ALLOW_SCAN = frozenset({"updated_at"})
+    INDEXED_PARAMS = ("tags",)
+
+    # (counter column, counted table)
+    COUNTERS = (("comment_count", "comment"), ("tag_count", "tagged_post"))
+
+    @classmethod
+    def ddl(cls) -> tuple[str, ...]:
+        statements = []
+        for counter, table in cls.COUNTERS:
+            statements += [
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_{counter}_insert
+                AFTER INSERT ON {table} BEGIN
+                    UPDATE post SET {counter} = {counter} + 1 WHERE id = NEW.post_id;
+                END
+                """,
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_{counter}_delete
+                AFTER DELETE ON {table} BEGIN
+                    UPDATE post SET {counter} = {counter} - 1 WHERE id = OLD.post_id;
+                END
+                """,
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_{counter}_update
+                AFTER UPDATE OF post_id ON {table}
+                WHEN OLD.post_id IS NOT NEW.post_id BEGIN
+                    UPDATE post SET {counter} = {counter} - 1 WHERE id = OLD.post_id;
+                    UPDATE post SET {counter} = {counter} + 1 WHERE id = NEW.post_id;
+                END
+                """,
+            ]
+        # Archived comments still count: archiving deletes the comment row,
+        # so add it back when it lands in the archive.
+        statements.append(
+            """
+            CREATE TRIGGER IF NOT EXISTS comment_archive_comment_count_insert
+            AFTER INSERT ON comment_archive BEGIN
+                UPDATE post SET comment_count = comment_count + 1 WHERE id = NEW.post_id;
+            END
+            """,
+        )
+        return tuple(statements)
+
+    @classmethod
+    def migrate(cls, conn: sqlalchemy.Connection) -> None:
+        columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(post)")}
+        missing = [counter for counter, _ in cls.COUNTERS if counter not in columns]
+        for counter in missing:
+            conn.exec_driver_sql(
+                f"ALTER TABLE post ADD COLUMN {counter} INTEGER NOT NULL DEFAULT 0",
+            )
+        if missing:
+            with Session(conn) as session:
+                fixed = cls.repair_counters(session)
+            LOG.info("added post counters", extra={"columns": missing, "posts": fixed})
+        super().migrate(conn)
+
+    @classmethod
+    def repair_counters(cls, session: Session) -> int:
+        """Recompute every post's counters from scratch; returns posts fixed."""
+        counted = {
+            "comment": (Comment.Table.__table__, Comment.archive_table()),
+            "tagged_post": (TaggedPost.Table.__table__,),
+        }
+        values = {}
+        mismatch = []
+        for counter, table in cls.COUNTERS:
+            actual = sum(
+                select(func.count())
+                .where(source.c.post_id == cls.Table.id)
+                .scalar_subquery()
+                for source in counted[table]
+            )
+            values[counter] = actual
+            mismatch.append(getattr(cls.Table, counter) != actual)
+        result = session.exec(  # type: ignore[call-overload]
+            sqlalchemy.update(cls.Table)
+            .where(sqlalchemy.or_(*mismatch))
+            .values(values),
+            execution_options={"synchronize_session": False},
+        )
+        return result.rowcount
 
     @classmethod
     def obj_apply(cls, obj: Table | sqlalchemy.engine.row.Row[tuple[Table]], session: Session) -> Reader:  # type: ignore[override]
-        print(obj)
-        print(type(obj))
+        return cls.objs_apply([obj], session)[0]
+
+    @classmethod
+    def unwrap(cls, obj: Table | sqlalchemy.engine.row.Row[tuple[Table]]) -> Table:
         if type(obj) is sqlalchemy.engine.row.Row:
-            print('hello')
             obj = obj[0]
-        else:
-            print('no')
-        tagged_posts = session.exec(
-            select(TaggedPost.Table).where(TaggedPost.Table.post_id == obj.id),  # type: ignore
-        ).all()
-        print('x', tagged_posts)
-        tags = [
-            session.get(Tag.Table, tagged_post.tag_id) for tagged_post in tagged_posts
-        ]
-        reader_obj = cls.Reader(name=None, content=None, author=None)
-        for field in obj.model_fields:
-            setattr(reader_obj, field, getattr(obj, field))
-        reader_obj.tags = tags
-        return reader_obj
+        return obj
+
+    @classmethod
+    def objs_apply(  # type: ignore[override]
+        cls,
+        objs: Sequence[Table | sqlalchemy.engine.row.Row[tuple[Table]]],
+        session: Session,
+        include: INCLUDE = frozenset(),
+        *,
+        include_archived: bool = False,
+    ) -> list[Reader]:
+        posts = [cls.unwrap(obj) for obj in objs]
+        post_ids = [post.id for post in posts]
+
+        tagged_posts = group_by(
+            session, TaggedPost.source(include_archived).post_id, post_ids,
+        )
+        LOG.debug(
+            "post.objs_apply",
+            extra={
+                "posts": len(posts),
+                "tagged_posts": len(tagged_posts),
+                "include": sorted(include),
+            },
+        )
+        tags = Tag.lookup_many(
+            session,
+            (
+                tagged_post.tag_id
+                for group in tagged_posts.values()
+                for tagged_post in group
+            ),
+        )
+        users = (
+            User.lookup_many(session, (post.author for post in posts))
+            if "author" in include
+            else {}
+        )
+        comments = (
+            group_by(session, Comment.source(include_archived).post_id, post_ids)
+            if "comments" in include
+            else {}
+        )
+
+        readers = []
+        for post in posts:
+            reader_obj = cls.Reader(name=None, content=None, author=None)
+            for field in cls.Table.model_fields:
+                setattr(reader_obj, field, getattr(post, field))
+            reader_obj.tags = [
+                tags[tagged_post.tag_id]
+                for tagged_post in tagged_posts.get(post.id, [])
+                if tagged_post.tag_id in tags
+            ]
+            if "author" in include:
+                reader_obj.author_user = (
+                    User.Reader.model_validate(user, from_attributes=True)
+                    if (user := users.get(post.author))
+                    else None
+                )
+            if "comments" in include:
+                reader_obj.comments = comments.get(post.id, [])
+            readers.append(reader_obj)
+        return readers
 
     T = TypeVar('T')
 
@@ -587,45 +1361,24 @@ class Post(Endpointer):
         query,
         *,
         session: Session,
-        name: str | None = None,
-        author: int | None = None,
         tags: str | None = None,
-        earliest_created: datetime | None = None,
-        latest_created: datetime | None = None,
-        earliest_updated: datetime | None = None,
-        latest_updated: datetime | None = None,
     ):
-        # return query
-        # # ignore passed in query, use our own
-        other_tables = (TaggedPost.Table, User.Table)
-        non_empty_other_tables = [
-            session.exec(select(table)).first() is not None
-            for table in other_tables
-        ]
-        query = select(cls.Table, *non_empty_other_tables)
-        # print(name, author, tags, earliest_created, earliest_updated, latest_created, latest_updated)
-        if name:
-            query = query.where(cls.Table.name == name)
-        if author:
-            query = query.where(cls.Table.author == author)
         if tags:
-            tag_ids = tags.split(",")
-            for tag in tag_ids:
+            try:
+                tag_ids = [int(tag) for tag in tags.split(",") if tag]
+            except ValueError:
+                raise HTTPException(status_code=422, detail="Invalid tags") from None
+            entity = query.column_descriptions[0]["entity"]
+            # archived posts have their tags in the archive too
+            tagged = TaggedPost.source(entity is not cls.Table)
+            for tag_id in tag_ids:
                 query = query.where(
-                    TaggedPost.Table.post_id == cls.Table.id,
-                    TaggedPost.Table.tag_id == int(tag)
+                    entity.id.in_(  # type: ignore[union-attr]
+                        select(tagged.post_id).where(tagged.tag_id == tag_id),
+                    ),
                 )
-
-        # TODO check that this actually filters correctly
-        if earliest_created:
-            query = query.where(cls.Table.created_at > earliest_created)  # type: ignore[operator]
-        if latest_created:
-            query = query.where(cls.Table.created_at < latest_created)  # type: ignore[operator]
-        if earliest_updated:
-            query = query.where(cls.Table.updated_at > earliest_updated)  # type: ignore[operator]
-        if latest_updated:
-            query = query.where(cls.Table.updated_at < earliest_updated)  # type: ignore[operator]
-        print(query)
+        if LOG.isEnabledFor(logging.DEBUG):  # compiling the query isn't free
+            LOG.debug("post.query", extra={"sql": str(query)})
         return query
 
     @classmethod
@@ -641,40 +1394,63 @@ class Post(Endpointer):
     ]:
         def route(
             *,
-            session: Session = Depends(cls.get_db),
+            session: Session = Depends(cls.get_read_db),
             pagination: Pagination,
             sort_: SORT = sort_factory(cls.Table),
-            name: str | None = None,
-            author: int | None = None,
+            filters: FILTER = cls.filter_set().dependency,
             tags: str | None = None,
-            earliest_created: datetime | None = None,
-            latest_created: datetime | None = None,
-            earliest_updated: datetime | None = None,
-            latest_updated: datetime | None = None,
+            include: INCLUDE = include_factory(cls.INCLUDES),
+            include_archived: bool = archived_factory(True),
         ) -> list[Post.Reader]:
             return cls._do_get_all(
                 session=session,
                 pagination=pagination,
                 sort_=sort_,
-                name=name,
-                author=author,
+                filters=filters,
+                include=include,
+                include_archived=include_archived,
                 tags=tags,
-                earliest_created=earliest_created,
-                latest_created=latest_created,
-                earliest_updated=earliest_updated,
-                latest_updated=latest_updated,
             )
 
         return route
 
+    @classmethod
+    def get_one(
+        cls,
+    ) -> Callable[
+        [DefaultNamedArg(Session, "session"), NamedArg(int, "obj_id")], Table,
+    ]:
+        def route(
+            *,
+            session: Session = Depends(cls.get_read_db),
+            obj_id: int,
+            include: INCLUDE = include_factory(cls.INCLUDES),
+            include_archived: bool = archived_factory(True),
+        ) -> Post.Reader:
+            obj = session.get(cls.Table, obj_id)
+            if obj is None and include_archived:
+                obj = cls.get_archived(session, obj_id)
+            if obj is None:
+                raise ElemNotFoundException(cls.__name__, obj_id)
+            return cls.objs_apply(
+                [obj], session, include, include_archived=include_archived,
+            )[0]
+
+        return route
+
 
 class Comment(Endpointer):
     prefix = "comments"
+    SHARD = "posts"
 
     SEED_OBJS = ()
 
     class Table(SQLModel, table=True):
         __tablename__ = "comment"
+        __table_args__ = (
+            sqlalchemy.Index("ix_comment_post_id_created_at", "post_id", "created_at"),
+            {"sqlite_autoincrement": True},
+        )
 
         id: int | None = ID_FIELD
         content: str | None
@@ -692,41 +1468,5 @@ class Comment(Endpointer):
         content: str | None = None
         author: int | None = None
 
-    @classmethod
-    def query_apply(  # type: ignore[override]
-        cls,
-        query: Any,
-        session: Session,
-        post_id: int | None = None,
-    ) -> Any:
-        if post_id:
-            query = query.where(cls.Table.post_id == post_id)
-        return query
-
-
-    @classmethod
-    def get_all(
-        cls,
-    ) -> Callable[
-        [
-            DefaultNamedArg(Session, "session"),
-            NamedArg(dict[str, int | None], "pagination"),
-            DefaultNamedArg(dict[str, str], "sort_"),
-        ],
-        list[Endpointer.Table],
-    ]:
-        def route(
-            *,
-            session: Session = Depends(cls.get_db),
-            pagination: Pagination,
-            sort_: SORT = sort_factory(cls.Table),
-            post_id: int | None = None,
-        ) -> list[Endpointer.Table]:
-            return cls._do_get_all(
-                session,
-                pagination,
-                sort_,
-                post_id=post_id,
-            )
-
-        return route
+    FILTERS = {"post_id": ("eq", "in"), "author": ("eq", "in")}
+    ARCHIVE_BY = "created_at"
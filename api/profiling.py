@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import functools
+import io
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable
+
+import anyio.to_thread
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse
+from fastapi.routing import APIRoute
+
+from . import admin
+
+if TYPE_CHECKING:
+    from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+HEADER = b"x-profile"
+
+# From 3.12 cProfile uses sys.monitoring: one profiler at a time for the
+# whole process, seeing every thread.
+PROFILES_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+@dataclass
+class RequestProfile:
+    """The profiles taken while serving one request, one per thread segment."""
+
+    profiles: list[cProfile.Profile] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def runcall(
+        self: RequestProfile, func: Callable[..., Any], *args: Any, **kwargs: Any,
+    ) -> Any:
+        if PROFILES_ALL_THREADS:
+            # the middleware's profiler already sees this thread
+            return func(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            with self._lock:
+                self.profiles.append(profile)
+
+    def stats(self: RequestProfile) -> pstats.Stats | None:
+        with self._lock:
+            profiles = list(self.profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        stats.add(*profiles[1:])
+        return stats
+
+
+ACTIVE: ContextVar[RequestProfile | None] = ContextVar("profile", default=None)
+
+
+def profiled(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Profile ``func`` when it runs inside a profiled request.
+
+    When profiling is off this costs one ContextVar lookup per call. The
+    context is copied into the worker thread that runs sync routes, which is
+    why the profile is started here and not in the middleware: cProfile only
+    sees the thread it was enabled in.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if (profile := ACTIVE.get()) is None:
+            return func(*args, **kwargs)
+        return profile.runcall(func, *args, **kwargs)
+
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """An APIRoute whose sync endpoint is wrapped with ``profiled``."""
+
+    def __init__(
+        self: ProfiledRoute, path: str, endpoint: Callable[..., Any], **kwargs: Any,
+    ) -> None:
+        if not asyncio.iscoroutinefunction(endpoint):
+            endpoint = profiled(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+@dataclass(frozen=True)
+class Saved:
+    id: str
+    method: str
+    path: str
+    duration: float
+    created: float
+    file: Path
+
+
+RECENT: deque[Saved] = deque()
+
+
+class ProfilingMiddleware:
+    """cProfile selected requests and save the profiles to ``directory``.
+
+    A request is profiled when it carries ``X-Profile: 1`` and a valid
+    ``X-Admin-Token``, or at random with probability ``sample_rate``. The
+    profile covers the route itself (see ``ProfiledRoute``) as well as
+    validation and serialization on the event loop thread; the latter may
+    also pick up work of concurrent requests. On Python 3.12 and later the
+    profiler sees every thread, so the route's work of concurrent requests
+    shows up too. Only one request is profiled at a time, as a thread (from
+    3.12 the process) can only run one profiler.
+
+    The last ``keep`` profiles are kept on disk and listed at
+    ``/admin/profiles``.
+    """
+
+    def __init__(
+        self: ProfilingMiddleware,
+        app: ASGIApp,
+        *,
+        directory: Path,
+        sample_rate: float = 0.0,
+        keep: int = 50,
+    ) -> None:
+        self.app = app
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self._busy = False
+        directory.mkdir(parents=True, exist_ok=True)
+
+    def wanted(self: ProfilingMiddleware, scope: Scope) -> bool:
+        headers = dict(scope["headers"])
+        if headers.get(HEADER) == b"1":
+            token = headers.get(b"x-admin-token")
+            return admin.is_admin(token.decode("latin-1") if token else None)
+        return self.sample_rate > 0 and random.random() < self.sample_rate  # noqa: S311
+
+    async def __call__(
+        self: ProfilingMiddleware, scope: Scope, receive: Receive, send: Send,
+    ) -> None:
+        if scope["type"] != "http" or self._busy or not self.wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self._busy = True
+        request_profile = RequestProfile()
+        token = ACTIVE.set(request_profile)
+        path = re.sub(r"\W+", "_", scope["path"]).strip("_")
+        profile_id = f"{time.time_ns()}-{scope['method']}-{path}"
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-profile-id", profile_id.encode()),
+                ]
+            await send(message)
+
+        loop_profile = cProfile.Profile()
+        start = time.perf_counter()
+        loop_profile.enable()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            loop_profile.disable()
+            duration = time.perf_counter() - start
+            ACTIVE.reset(token)
+            self._busy = False
+            request_profile.profiles.append(loop_profile)
+            await anyio.to_thread.run_sync(
+                self.save, request_profile, profile_id, scope, duration,
+            )
+
+    def save(
+        self: ProfilingMiddleware,
+        request_profile: RequestProfile,
+        profile_id: str,
+        scope: Scope,
+        duration: float,
+    ) -> None:
+        if (stats := request_profile.stats()) is None:
+            return
+        file = self.directory / f"{profile_id}.prof"
+        stats.dump_stats(file)
+        RECENT.append(
+            Saved(profile_id, scope["method"], scope["path"], duration, time.time(), file),
+        )
+        while len(RECENT) > self.keep:
+            RECENT.popleft().file.unlink(missing_ok=True)
+
+
+def find(profile_id: str) -> Saved:
+    for saved in RECENT:
+        if saved.id == profile_id:
+            return saved
+    raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+
+
+@admin.ROUTER.get("/profiles")
+def list_profiles() -> list[dict[str, Any]]:
+    return [
+        {
+            "id": saved.id,
+            "method": saved.method,
+            "path": saved.path,
+            "duration": saved.duration,
+            "created": saved.created,
+        }
+        for saved in reversed(RECENT)
+    ]
+
+
+# before /profiles/{profile_id}, which would match the .prof name too
+@admin.ROUTER.get("/profiles/{profile_id}.prof", response_class=FileResponse)
+def download_profile(profile_id: str) -> FileResponse:
+    saved = find(profile_id)
+    return FileResponse(saved.file, filename=saved.file.name)
+
+
+@admin.ROUTER.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+def show_profile(
+    profile_id: str, sort: pstats.SortKey = pstats.SortKey.CUMULATIVE, limit: int = 40,
+) -> str:
+    out = io.StringIO()
+    pstats.Stats(str(find(profile_id).file), stream=out).sort_stats(sort).print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import asyncclick as click
+from sqlmodel import Session, create_engine
+
+from . import shards
+from .models import Post
+
+
+@click.command()
+@click.option('--db-path', required=True)
+@click.option('--db-shards/--no-db-shards', default=False)
+async def repair(db_path, db_shards):
+    """Recompute the denormalized comment and tag counters on every post."""
+    engine = create_engine(f"sqlite:///{Path(db_path)}")
+    shards.attach(engine, shards.files(Path(db_path)) if db_shards else {})
+    with Session(engine) as session:
+        fixed = Post.repair_counters(session)
+        session.commit()
+    click.echo(f"Repaired counters on {fixed} posts")
+
+
+if __name__ == "__main__":
+    repair()
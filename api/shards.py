@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import TYPE_CHECKING, Mapping
+
+from sqlalchemy import event
+
+from .models import Endpointer
+
+if TYPE_CHECKING:
+    from sqlalchemy.future import Engine as SQLAlchemyEngine
+
+
+def names() -> list[str]:
+    """The shards declared by the Endpointers, see ``Endpointer.SHARD``."""
+    return sorted({s.SHARD for s in Endpointer.__subclasses__() if s.SHARD})
+
+
+def files(db: Path) -> dict[str, Path]:
+    """One file per shard next to ``db``, e.g. ``forum-posts.db``."""
+    return {shard: db.with_name(f"{db.stem}-{shard}{db.suffix}") for shard in names()}
+
+
+def attach(
+    engine: SQLAlchemyEngine, shards: Mapping[str, Path], *, read_only: bool = False,
+) -> None:
+    """ATTACH the shard files to every connection ``engine`` opens.
+
+    SQLite resolves unqualified table names across attached databases, so
+    queries, including joins between shards, need no changes. Each file has
+    its own write lock: writes to tables of different shards don't wait for
+    each other. A transaction that writes to several shards is only atomic
+    across them in rollback journal mode, not in the WAL mode ``main.start``
+    puts them in; keep each write within one shard.
+    """
+    if not shards:
+        return
+
+    def attach_shards(dbapi_connection: object, connection_record: object) -> None:  # noqa: ARG001
+        for shard, file in shards.items():
+            target = f"file:{file}?mode=ro" if read_only else str(file)
+            dbapi_connection.execute(f'ATTACH DATABASE ? AS "{shard}"', (target,))  # type: ignore[attr-defined]
+
+    event.listen(engine, "connect", attach_shards)
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.requests import HTTPConnection
+
+from .admission import EXEMPT_SUFFIXES, READ_SUFFIXES
+from .db import client_key
+
+if TYPE_CHECKING:
+    from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Operational routes: rarely concurrent, and answered per caller.
+EXEMPT_PREFIXES = ("/admin/", "/metrics")
+
+# Requests differing in these never share a response.
+CREDENTIAL_HEADERS = (b"authorization", b"x-admin-token")
+
+Key = tuple[int, str, str, tuple[bytes | None, ...], str | None]
+Result = tuple["Message", bytes]
+
+
+class SingleFlightMiddleware:
+    """Share one execution between identical concurrent GET requests.
+
+    The first GET for a path and (normalized) query string runs as usual;
+    identical GETs arriving while it is still running wait for it and get a
+    copy of its response instead of running the route again.
+
+    Writes are never coalesced. Each write bumps a generation number that is
+    part of the key when it arrives and again when it responds, so reads
+    sent after a write's response never join a flight that started before
+    or during it. The bump is global rather than per prefix because
+    responses embed rows from other tables (posts carry tags, authors and
+    comments).
+
+    Requests only share a flight when they carry the same credentials. With
+    ``per_client``, they must also come from the same client (see
+    ``db.client_key``). This is for
+    read-your-writes, where a client that just wrote reads from the primary
+    and another client may read from a replica that lags behind.
+    """
+
+    def __init__(
+        self: SingleFlightMiddleware, app: ASGIApp, *, per_client: bool = False,
+    ) -> None:
+        self.app = app
+        self.per_client = per_client
+        self.generation = 0
+        self.shared = 0
+        self._flights: dict[Key, asyncio.Future[Result]] = {}
+
+    async def __call__(
+        self: SingleFlightMiddleware, scope: Scope, receive: Receive, send: Send,
+    ) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["path"].endswith(EXEMPT_SUFFIXES)
+            or scope["path"].startswith(EXEMPT_PREFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+        if scope["method"] != "GET":
+            if scope["path"].endswith(READ_SUFFIXES):
+                await self.app(scope, receive, send)
+                return
+            self.generation += 1
+
+            async def send_after_write(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    self.generation += 1
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_after_write)
+            finally:
+                self.generation += 1
+            return
+
+        key = self.key(scope)
+        if (flight := self._flights.get(key)) is not None:
+            try:
+                start, body = await asyncio.shield(flight)
+            except Exception:  # noqa: BLE001
+                pass  # the leader failed; run it ourselves
+            else:
+                self.shared += 1
+                await send(start)
+                await send({"type": "http.response.body", "body": body})
+                return
+            await self.app(scope, receive, send)
+            return
+
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[key] = flight
+        start: Message | None = None
+        chunks: list[bytes] = []
+
+        async def capture(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False) and start is not None:
+                    flight.set_result((start, b"".join(chunks)))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            if not flight.done():
+                flight.set_exception(RuntimeError("leader produced no response"))
+                flight.exception()  # mark retrieved; there may be no followers
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def key(self: SingleFlightMiddleware, scope: Scope) -> Key:
+        headers = dict(scope["headers"])
+        return (
+            self.generation,
+            scope["path"],
+            self.normalize(scope["query_string"]),
+            tuple(headers.get(name) for name in CREDENTIAL_HEADERS),
+            client_key(HTTPConnection(scope)) if self.per_client else None,
+        )
+
+    @staticmethod
+    def normalize(query_string: bytes) -> str:
+        query = parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)
+        return urlencode(sorted(query))
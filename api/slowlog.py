@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import functools
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy import event
+
+from . import admin
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Engine
+    from starlette.types import ASGIApp, Receive, Scope, Send
+
+LOG = logging.getLogger(__name__)
+
+ROUTE: ContextVar[str | None] = ContextVar("route", default=None)
+
+
+class RouteMiddleware:
+    """Remember which request a statement is run for, for the slow query log."""
+
+    def __init__(self: RouteMiddleware, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(
+        self: RouteMiddleware, scope: Scope, receive: Receive, send: Send,
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = ROUTE.set(f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            ROUTE.reset(token)
+
+
+@functools.lru_cache(maxsize=1024)
+def shape(statement: str) -> str:
+    """``statement`` with IN lists and literals collapsed, for grouping."""
+    statement = re.sub(r"\s+", " ", statement).strip()
+    statement = re.sub(r"\(\?(?:, \?)*\)", "(?...)", statement)
+    statement = re.sub(r"'(?:[^']|'')*'", "?", statement)
+    return re.sub(r"\b\d+\b", "?", statement)
+
+
+def redact(parameters: Any) -> Any:
+    """``parameters`` with strings and bytes replaced by their type.
+
+    Strings hold whatever users send, passwords and emails included; the
+    numbers (ids, limits, counts) are what explains a slow query anyway.
+    """
+    if isinstance(parameters, dict):
+        return {name: redact(value) for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return type(parameters)(redact(value) for value in parameters)
+    if isinstance(parameters, (str, bytes)):
+        return f"<{type(parameters).__name__}>"
+    return parameters
+
+
+@dataclass
+class Shape:
+    statement: str
+    count: int = 0
+    total: float = 0.0
+    slow: int = 0
+    max: float = 0.0
+    plan: list[str] | None = None
+    routes: dict[str, int] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class Slow:
+    statement: str
+    parameters: Any
+    duration: float
+    route: str | None
+    at: float
+
+
+class SlowQueryLog:
+    """Time every statement on the engines it is installed on.
+
+    Statements taking ``threshold`` seconds or more are logged (as a WARNING
+    on ``api.slowlog``) with their redacted parameters (see ``redact``), the
+    request they ran for and SQLite's ``EXPLAIN QUERY PLAN``, taken once per
+    statement shape. Counts and times are aggregated per shape for
+    ``/admin/slow-queries``, for the ``max_shapes`` most recently run shapes.
+    """
+
+    def __init__(
+        self: SlowQueryLog,
+        threshold: float = 0.1,
+        keep: int = 100,
+        max_shapes: int = 1000,
+    ) -> None:
+        self.threshold = threshold
+        self.recent: deque[Slow] = deque(maxlen=keep)
+        self.shapes: OrderedDict[str, Shape] = OrderedDict()
+        self.max_shapes = max_shapes
+        self._lock = threading.Lock()
+
+    def listeners(self: SlowQueryLog) -> dict[str, Any]:
+        return {
+            "before_cursor_execute": self.before,
+            "after_cursor_execute": self.after,
+            "handle_error": self.failed,
+        }
+
+    def install(self: SlowQueryLog, engine: Engine) -> None:
+        for name, listener in self.listeners().items():
+            event.listen(engine, name, listener)
+
+    def uninstall(self: SlowQueryLog, engine: Engine) -> None:
+        for name, listener in self.listeners().items():
+            event.remove(engine, name, listener)
+
+    @staticmethod
+    def before(conn: Any, *args: Any) -> None:  # noqa: ARG004
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @staticmethod
+    def failed(context: Any) -> None:
+        # after_cursor_execute doesn't run for a statement that raised; drop
+        # its start, or later statements would be timed from it
+        started = (
+            context.connection.info.get("query_start")
+            if context.connection is not None and context.execution_context is not None
+            else None
+        )
+        if started:
+            started.pop()
+
+    def after(
+        self: SlowQueryLog,
+        conn: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,  # noqa: ARG002
+        executemany: bool,  # noqa: FBT001
+    ) -> None:
+        duration = time.perf_counter() - conn.info["query_start"].pop()
+        key = shape(statement)
+        is_slow = duration >= self.threshold
+        with self._lock:
+            if (stats := self.shapes.get(key)) is None:
+                stats = self.shapes[key] = Shape(key)
+                if len(self.shapes) > self.max_shapes:
+                    self.shapes.popitem(last=False)
+            else:
+                self.shapes.move_to_end(key)
+            stats.count += 1
+            stats.total += duration
+            if not is_slow:
+                return
+            stats.slow += 1
+            stats.max = max(stats.max, duration)
+            route = ROUTE.get()
+            stats.routes[route or ""] = stats.routes.get(route or "", 0) + 1
+            explain = stats.plan is None and not executemany
+            if explain:
+                stats.plan = []  # claimed; filled in below, outside the lock
+            self.recent.append(
+                Slow(statement, redact(parameters), duration, route, time.time()),
+            )
+        if explain:
+            stats.plan = self.explain(cursor, statement, parameters)
+        LOG.warning(
+            "slow query",
+            extra={
+                "duration": round(duration, 6),
+                "statement": statement,
+                "parameters": redact(parameters),
+                "route": route,
+                "plan": stats.plan,
+            },
+        )
+
+    @staticmethod
+    def explain(cursor: Any, statement: str, parameters: Any) -> list[str]:
+        try:
+            rows = cursor.connection.execute(
+                f"EXPLAIN QUERY PLAN {statement}", parameters,
+            ).fetchall()
+        except Exception as e:  # noqa: BLE001
+            return [f"EXPLAIN failed: {e}"]
+        return [row[-1] for row in rows]
+
+    def report(self: SlowQueryLog, limit: int = 20) -> dict[str, Any]:
+        with self._lock:
+            shapes = sorted(
+                (s for s in self.shapes.values() if s.slow),
+                key=lambda s: s.total,
+                reverse=True,
+            )[:limit]
+            return {
+                "threshold": self.threshold,
+                "shapes": [
+                    {
+                        "statement": s.statement,
+                        "count": s.count,
+                        "slow": s.slow,
+                        "total": s.total,
+                        "mean": s.total / s.count,
+                        "max": s.max,
+                        "routes": dict(s.routes),
+                        "plan": s.plan,
+                    }
+                    for s in shapes
+                ],
+                "recent": [
+                    {
+                        "statement": slow.statement,
+                        "parameters": repr(slow.parameters),
+                        "duration": slow.duration,
+                        "route": slow.route,
+                        "at": slow.at,
+                    }
+                    for slow in reversed(self.recent)
+                ],
+            }
+
+    def clear(self: SlowQueryLog) -> None:
+        with self._lock:
+            self.shapes.clear()
+            self.recent.clear()
+
+
+SLOW_QUERIES = SlowQueryLog()
+
+
+@admin.ROUTER.get("/slow-queries")
+def slow_queries(limit: int = 20) -> dict[str, Any]:
+    return SLOW_QUERIES.report(limit)
+
+
+@admin.ROUTER.delete("/slow-queries")
+def clear_slow_queries() -> dict[str, bool]:
+    SLOW_QUERIES.clear()
+    return {"ok": True}
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date
+from typing import TYPE_CHECKING, Any, Callable, Hashable
+
+import sqlalchemy
+from fastapi import APIRouter, Depends
+from sqlmodel import Session, SQLModel, func, select
+
+from .db import Database  # noqa: TCH001
+from .models import Comment, Endpointer, Post, Tag, TaggedPost, User, database
+from .profiling import ProfiledRoute
+
+if TYPE_CHECKING:
+    from sqlalchemy.sql import Select
+
+ROUTER = APIRouter(prefix="/stats", tags=["stats"], route_class=ProfiledRoute)
+
+
+def day_of(column: Any) -> Any:
+    return func.date(column, type_=sqlalchemy.String)
+
+
+class BucketedCount:
+    """Counts per (day, key), cached per day and refreshed incrementally.
+
+    ``queries`` build ``(day, key, count)`` selects over rows created at or
+    after ``since`` (or all rows when ``since`` is None). A refresh only
+    recomputes the most recent cached day onwards; older days are treated as
+    closed. Everything is recomputed every ``full_refresh_after`` seconds to
+    pick up deletes and late changes to closed days.
+    """
+
+    def __init__(
+        self: BucketedCount,
+        *queries: Callable[[date | None], Select],
+        refresh_after: float = 5.0,
+        full_refresh_after: float = 3600.0,
+    ) -> None:
+        self.queries = queries
+        self.refresh_after = refresh_after
+        self.full_refresh_after = full_refresh_after
+        self._buckets: dict[date, Counter[Hashable]] = {}
+        self._lock = threading.Lock()
+        self._refreshed_at = float("-inf")
+        self._full_refreshed_at = float("-inf")
+
+    def refresh(self: BucketedCount, session: Session) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if now - self._refreshed_at < self.refresh_after:
+                return
+            full = now - self._full_refreshed_at >= self.full_refresh_after
+            since = None if full or not self._buckets else max(self._buckets)
+            fresh: dict[date, Counter[Hashable]] = defaultdict(Counter)
+            for query in self.queries:
+                for day, key, count in session.exec(query(since)).all():  # type: ignore[call-overload]
+                    fresh[date.fromisoformat(day)][key] += count
+            if full:
+                self._buckets = dict(fresh)
+                self._full_refreshed_at = now
+            else:
+                self._buckets = {
+                    day: counts
+                    for day, counts in self._buckets.items()
+                    if since is None or day < since
+                } | fresh
+            self._refreshed_at = now
+
+    def per_day(
+        self: BucketedCount, since: date | None = None, until: date | None = None,
+    ) -> dict[date, Counter[Hashable]]:
+        return {
+            day: counts
+            for day, counts in sorted(self._buckets.items())
+            if (since is None or day >= since) and (until is None or day <= until)
+        }
+
+    def totals(
+        self: BucketedCount, since: date | None = None, until: date | None = None,
+    ) -> Counter[Hashable]:
+        total: Counter[Hashable] = Counter()
+        for counts in self.per_day(since, until).values():
+            total.update(counts)
+        return total
+
+    def clear(self: BucketedCount) -> None:
+        with self._lock:
+            self._buckets = {}
+            self._refreshed_at = self._full_refreshed_at = float("-inf")
+
+
+def created_since(query: Select, column: Any, since: date | None) -> Select:
+    # created_at is stored as ISO text, so the day compares (and uses an index)
+    # as a plain string prefix.
+    if since is None:
+        return query
+    return query.where(column >= sqlalchemy.literal(since.isoformat(), sqlalchemy.String))
+
+
+# Archived rows still count: every query reads the table and its archive,
+# see Endpointer.source.
+
+
+def posts_per_day(since: date | None) -> Select:
+    post = Post.source(True)
+    day = day_of(post.created_at)
+    query = select(day, sqlalchemy.null(), func.count()).group_by(day)
+    return created_since(query, post.created_at, since)
+
+
+def tagged_posts_per_day(since: date | None) -> Select:
+    post = Post.source(True)
+    tagged_post = TaggedPost.source(True)
+    day = day_of(post.created_at)
+    query = (
+        select(day, tagged_post.tag_id, func.count())
+        .join(post, post.id == tagged_post.post_id)
+        .group_by(day, tagged_post.tag_id)
+    )
+    return created_since(query, post.created_at, since)
+
+
+def posts_per_author(since: date | None) -> Select:
+    post = Post.source(True)
+    day = day_of(post.created_at)
+    query = select(day, post.author, func.count()).group_by(day, post.author)
+    return created_since(query, post.created_at, since)
+
+
+def comments_per_author(since: date | None) -> Select:
+    comment = Comment.source(True)
+    day = day_of(comment.created_at)
+    query = (
+        select(day, comment.author, func.count())
+        .group_by(day, comment.author)
+    )
+    return created_since(query, comment.created_at, since)
+
+
+# name -> queries, counted per database, see aggregate()
+AGGREGATES: dict[str, tuple[Callable[[date | None], Select], ...]] = {
+    "posts": (posts_per_day,),
+    "tagged_posts": (tagged_posts_per_day,),
+    "author_posts": (posts_per_author,),
+    "author_comments": (comments_per_author,),
+}
+
+
+def aggregate(db: Database, name: str) -> BucketedCount:
+    """The ``AGGREGATES`` entry ``name`` for ``db``, kept on the Database."""
+    if (found := db.aggregates.get(name)) is None:
+        found = db.aggregates.setdefault(name, BucketedCount(*AGGREGATES[name]))
+    return found
+
+
+class DayCount(SQLModel):
+    day: date
+    posts: int
+
+
+class TagCount(SQLModel):
+    tag_id: int
+    name: str | None
+    posts: int
+
+
+class AuthorActivity(SQLModel):
+    user_id: int
+    name: str | None
+    posts: int
+    comments: int
+
+
+@ROUTER.get("/posts/per_day", response_model=list[DayCount])
+def get_posts_per_day(
+    *,
+    session: Session = Depends(Endpointer.get_read_db),
+    db: Database = Depends(database),
+    since: date | None = None,
+    until: date | None = None,
+) -> list[DayCount]:
+    posts = aggregate(db, "posts")
+    posts.refresh(session)
+    return [
+        DayCount(day=day, posts=sum(counts.values()))
+        for day, counts in posts.per_day(since, until).items()
+    ]
+
+
+@ROUTER.get("/tags/top", response_model=list[TagCount])
+def get_top_tags(
+    *,
+    session: Session = Depends(Endpointer.get_read_db),
+    db: Database = Depends(database),
+    limit: int = 10,
+    since: date | None = None,
+    until: date | None = None,
+) -> list[TagCount]:
+    tagged_posts = aggregate(db, "tagged_posts")
+    tagged_posts.refresh(session)
+    top = tagged_posts.totals(since, until).most_common(limit)
+    tags = Tag.lookup_many(session, (tag_id for tag_id, _ in top))
+    return [
+        TagCount(
+            tag_id=tag_id,
+            name=tag.name if (tag := tags.get(tag_id)) else None,
+            posts=posts,
+        )
+        for tag_id, posts in top
+    ]
+
+
+@ROUTER.get("/authors/active", response_model=list[AuthorActivity])
+def get_active_authors(
+    *,
+    session: Session = Depends(Endpointer.get_read_db),
+    db: Database = Depends(database),
+    limit: int = 10,
+    since: date | None = None,
+    until: date | None = None,
+) -> list[AuthorActivity]:
+    author_posts = aggregate(db, "author_posts")
+    author_comments = aggregate(db, "author_comments")
+    author_posts.refresh(session)
+    author_comments.refresh(session)
+    posts = author_posts.totals(since, until)
+    comments = author_comments.totals(since, until)
+    top = (posts + comments).most_common(limit)
+    users = User.lookup_many(session, (user_id for user_id, _ in top))
+    return [
+        AuthorActivity(
+            user_id=user_id,
+            name=user.name if (user := users.get(user_id)) else None,
+            posts=posts[user_id],
+            comments=comments[user_id],
+        )
+        for user_id, _ in top
+        if user_id is not None
+    ]
@@ -1,61 +1,269 @@
-from typing import Any, Type, TypeVar, Union
+from __future__ import annotations
 
-from fastapi import Depends, Query
+import inspect
+import typing
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Type, TypeVar
+
+from fastapi import Depends, HTTPException, Query
 from pydantic import BaseModel
+from sqlalchemy import and_
+
+from .loaders import CHUNK_SIZE
 
-FILTER = dict[str, Union[int, float, str, bool, None]]
-SORT = dict[str, str]
+FILTER = tuple["Condition", ...]
+SORT = list[tuple[str, bool]]  # (field, descending)
+INCLUDE = frozenset[str]
 
 PYDANTIC_SCHEMA = BaseModel
 
 T = TypeVar("T", bound=PYDANTIC_SCHEMA)
-FILTER_MAPPING = {
-    "int": int,
-    "float": float,
-    "bool": bool,
-    "str": str,
-    "ConstrainedStrValue": str,
+
+# operator -> (query parameter suffix, clause builder)
+FILTER_OPS: dict[str, tuple[str, Callable[[Any, Any], Any]]] = {
+    "eq": ("", lambda column, value: column == value),
+    "in": ("__in", lambda column, values: column.in_(values)),
+    "lt": ("__lt", lambda column, value: column < value),
+    "gt": ("__gt", lambda column, value: column > value),
+    # a range rather than LIKE, so SQLite can serve it from the index
+    "prefix": (
+        "__prefix",
+        lambda column, value: and_(column >= value, column < value + "\U0010ffff"),
+    ),
 }
 
 
-def query_factory(schema: Type[T]) -> Any:
-    """Dynamically builds a Fastapi query dependency based on all available field in the."""
-    _str = "{}: Optional[{}] = Query(None)"
-    args_str = ", ".join(
-        [
-            _str.format(name, FILTER_MAPPING[field.type_.__name__].__name__)
-            for name, field in schema.model_fields.items()  # type: ignore
-            if field.type_.__name__ in FILTER_MAPPING
-        ],
-    )
-
-    _str = "{}={}"
-    return_str = ", ".join(
-        [
-            _str.format(name, field.name)
-            for name, field in schema.model_fields.items()  # type: ignore
-            if field.type_.__name__ in FILTER_MAPPING
-        ],
-    )
-
-    filter_func_src = f"""
-def filter_func({args_str}) -> FILTER:
-    ret = dict({return_str})
-    return {{k:v for k, v in ret.items() if v is not None}}
-"""
-
-    exec(filter_func_src, globals(), locals())
-    return Depends(locals().get("filter_func"))
+@dataclass(frozen=True)
+class Condition:
+    field: str
+    op: str
+    value: Any
+
+    def clause(self: Condition, entity: Any) -> Any:
+        return FILTER_OPS[self.op][1](getattr(entity, self.field), self.value)
+
+
+def indexed_columns(table: Any) -> set[str]:
+    """Columns that lead an index (or the primary key) of ``table``."""
+    leading = {index.columns[0].name for index in table.indexes}
+    leading |= {column.name for column in table.columns if column.index}
+    if table.primary_key.columns:
+        leading.add(table.primary_key.columns[0].name)
+    return leading
+
+
+def field_type(table: Any, field: str) -> type:
+    """The Python type of a model field, without its ``| None``.
+
+    Not the column's ``python_type``: SQLModel's datetime column reports
+    ``object``, which would hand the database an unparsed string.
+    """
+    annotation = table.model_fields[field].annotation
+    args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+    return args[0] if len(args) == 1 else annotation
+
+
+class FilterSet:
+    """Typed filters for one table, compiled once into a FastAPI dependency.
+
+    ``spec`` maps a field to the operators clients may use on it. ``eq`` is
+    the bare field name (``?author=1``), the others add a suffix
+    (``?author__in=1,2``, ``?created_at__gt=...``, ``?name__prefix=Ar``).
+    ``aliases`` adds extra parameter names for ``field__op`` pairs.
+
+    Filtering on a column that doesn't lead an index is refused at startup,
+    so clients can't ask for a full table scan, unless the column is listed
+    in ``allow_scan`` or ``scan_with_index``. The latter may only be filtered
+    on together with an indexed filter: one of the table's own, or one of
+    the ``indexed_params`` the route applies itself (such as Post's
+    ``?tags=``).
+
+    ``__in`` takes at most CHUNK_SIZE values, to stay below SQLite's limit
+    on query parameters.
+    """
+
+    def __init__(
+        self: FilterSet,
+        table: Any,
+        spec: dict[str, tuple[str, ...]],
+        aliases: dict[str, str] | None = None,
+        allow_scan: frozenset[str] = frozenset(),
+        scan_with_index: frozenset[str] = frozenset(),
+        indexed_params: tuple[str, ...] = (),
+    ) -> None:
+        sa_table = table.__table__
+        indexed = indexed_columns(sa_table)
+        self.params: dict[str, tuple[str, str, type]] = {}
+        self.scanned = scan_with_index - indexed - allow_scan
+        for field, ops in spec.items():
+            if field not in sa_table.columns:
+                msg = f"{sa_table.name} has no column {field}"
+                raise ValueError(msg)
+            if field not in indexed | allow_scan | scan_with_index:
+                msg = f"Filtering {sa_table.name}.{field} would scan the table; index it or allow_scan it"
+                raise ValueError(msg)
+            type_ = field_type(table, field)
+            for op in ops:
+                suffix, _ = FILTER_OPS[op]
+                self.params[f"{field}{suffix}"] = (field, op, type_)
+        for alias, target in (aliases or {}).items():
+            self.params[alias] = self.params[target]
+
+        def filter_func(**values: Any) -> FILTER:
+            conditions = tuple(
+                self.condition(param, value)
+                for param, value in values.items()
+                if value is not None and param in self.params
+            )
+            indexed_param = any(values.get(param) for param in indexed_params)
+            if (
+                conditions
+                and all(c.field in self.scanned for c in conditions)
+                and not indexed_param
+            ):
+                fields = ", ".join(sorted({c.field for c in conditions}))
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Filter on {fields} only together with an indexed field",
+                )
+            return conditions
+
+        filter_func.__signature__ = inspect.Signature(  # type: ignore[attr-defined]
+            [
+                inspect.Parameter(
+                    param,
+                    inspect.Parameter.KEYWORD_ONLY,
+                    default=Query(None),
+                    annotation=Optional[str if op == "in" else type_],  # noqa: UP007
+                )
+                for param, (_, op, type_) in self.params.items()
+            ]
+            + [
+                # only looked at; the route declares and applies these itself
+                inspect.Parameter(
+                    param,
+                    inspect.Parameter.KEYWORD_ONLY,
+                    default=Query(None, include_in_schema=False),
+                    annotation=Optional[str],  # noqa: UP007
+                )
+                for param in indexed_params
+            ],
+        )
+        self.dependency = Depends(filter_func)
+
+    def condition(self: FilterSet, param: str, value: Any) -> Condition:
+        field, op, type_ = self.params[param]
+        if op == "in":
+            try:
+                value = [type_(item) for item in value.split(",") if item]
+            except ValueError:
+                raise HTTPException(
+                    status_code=422, detail=f"Invalid value in {param}",
+                ) from None
+            if len(value) > CHUNK_SIZE:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"At most {CHUNK_SIZE} values in {param}",
+                )
+        return Condition(field, op, value)
 
 
 def sort_factory(schema: Type[T]) -> Any:
-    fields = [field.title for field in schema.model_fields.values()]  # type: ignore
+    fields = list(schema.model_fields)
+    pk = [column.name for column in schema.__table__.primary_key.columns]  # type: ignore[attr-defined]
 
     def sort_func(
-        sort_: str = Query(None, alias="sort", enum=fields),
+        sort_: str = Query(
+            None,
+            alias="sort",
+            description=(
+                "Comma separated fields, '-' for descending, e.g. -created_at,id. "
+                "The primary key breaks ties in the direction of the first field. "
+                f"Fields: {', '.join(fields)}"
+            ),
+        ),
         direction: str = Query(None, enum=["asc", "desc"]),
     ) -> SORT:
-        ret = {"sort": sort_, "reverse": direction == "desc"}
-        return {k: v for k, v in ret.items() if v}  # type: ignore
+        keys = []
+        for key in (sort_ or "").split(","):
+            field = key.strip().removeprefix("-")
+            if not field:
+                continue
+            if field not in fields:
+                raise HTTPException(status_code=422, detail=f"Cannot sort on {field}")
+            keys.append((field, key.strip().startswith("-") or direction == "desc"))
+        if not keys and direction == "desc":
+            # as before sort=: a bare direction reverses the primary key order
+            keys = [(field, True) for field in pk]
+        return keys
 
     return Depends(sort_func)
+
+
+def index_orders(table: Any) -> list[tuple[str, ...]]:
+    """Column orders that ``table``'s indexes can be scanned in.
+
+    In a rowid table every index implicitly ends with the rowid, i.e. with an
+    INTEGER PRIMARY KEY, so that is appended.
+    """
+    pk = tuple(column.name for column in table.primary_key.columns)
+    rowid = pk if len(pk) == 1 and table.primary_key.columns[0].type.python_type is int else ()
+    orders = [pk]
+    for index in table.indexes:
+        columns = tuple(column.name for column in index.columns)
+        orders.append(columns + tuple(c for c in rowid if c not in columns))
+    return orders
+
+
+def index_servable(
+    keys: list[tuple[str, bool]], orders: list[tuple[str, ...]], fixed: set[str],
+) -> bool:
+    """Whether an index can return rows in ``keys`` order without sorting.
+
+    Leading index columns pinned by an equality filter (``fixed``) don't
+    affect the order and may be skipped. SQLite scans indexes in either
+    direction but not in mixed directions.
+    """
+    if len({descending for _, descending in keys}) > 1:
+        return False
+    fields = tuple(field for field, _ in keys)
+    for order in orders:
+        start = 0
+        while start < len(order) and order[start] in fixed and order[start] not in fields:
+            start += 1
+        if order[start : start + len(fields)] == fields:
+            return True
+    return False
+
+
+def include_factory(relations: tuple[str, ...]) -> Any:
+    def include_func(
+        include: str = Query(
+            "",
+            description=f"Comma separated relations to embed: {', '.join(relations)}",
+        ),
+    ) -> INCLUDE:
+        requested = frozenset(name for name in include.split(",") if name)
+        if unknown := requested - set(relations):
+            raise HTTPException(
+                status_code=422,
+                detail=f"Cannot include {', '.join(sorted(unknown))}",
+            )
+        return requested
+
+    return Depends(include_func)
+
+
+def archived_factory(enabled: bool) -> Any:  # noqa: FBT001
+    """``?include_archived=`` for tables with an archive, else always False."""
+    if not enabled:
+        return Depends(lambda: False)
+
+    def archived_func(
+        include_archived: bool = Query(
+            False, description="Also search rows moved to the archive",
+        ),
+    ) -> bool:
+        return include_archived
+
+    return Depends(archived_func)
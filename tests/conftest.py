@@ -0,0 +1,60 @@
+from typing import Generator
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, create_engine
+
+from api import credentials, profiling, slowlog
+from api.models import Endpointer
+
+from .common import APP, mkclient
+
+# One in-memory database for the whole run: StaticPool hands every checkout
+# the same connection, which the app's worker threads share. Under
+# pytest-xdist every worker is a process of its own, and so has its own
+# database.
+ENGINE = create_engine(
+    "sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False},
+)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def close_client() -> Generator[None, None, None]:
+    # Cheap hashes; the real cost is covered by the credentials tests' own
+    # calls to hash_password.
+    credentials.configure(2, 32, n=2**4)
+    yield
+    if mkclient.cache_info().currsize:
+        mkclient().__exit__(None, None, None)
+
+
+@pytest.fixture(scope="session")
+def schema() -> Generator[None, None, None]:
+    Endpointer.init(ENGINE)
+    yield
+
+
+def reset_state() -> None:
+    """Forget in-process state that would otherwise leak between tests."""
+    # lookup caches, event hubs and stats come with each test's Database
+    slowlog.SLOW_QUERIES.clear()
+    profiling.RECENT.clear()
+
+
+@pytest.fixture()
+def session(schema) -> Generator[Session, None, None]:
+    """A session on a database that is rolled back after the test.
+
+    The test runs inside a transaction and a SAVEPOINT on the shared
+    connection. Route sessions, bound to the same connection, see the
+    SAVEPOINT and use SAVEPOINTs of their own, so their commits never
+    reach the outer transaction.
+    """
+    with ENGINE.connect() as conn:
+        outer = conn.begin()
+        conn.begin_nested()
+        Endpointer.connect(APP, conn)
+        reset_state()
+        with Session(conn) as session:
+            yield session
+        outer.rollback()
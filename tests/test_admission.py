@@ -0,0 +1,79 @@
+import asyncio
+import contextlib
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from api.admission import AdmissionMiddleware, Budget, Shed
+
+
+def make_app(release: asyncio.Event) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(
+        AdmissionMiddleware,
+        read_limit=1,
+        read_queue=1,
+        write_limit=0,
+        write_queue=0,
+        timeout=5,
+        retry_after=3,
+    )
+
+    @app.get("/slow")
+    async def slow() -> dict[str, bool]:
+        await release.wait()
+        return {"ok": True}
+
+    @app.post("/write")
+    async def write() -> dict[str, bool]:
+        return {"ok": True}
+
+    return app
+
+
+def test_sheds_beyond_limit_and_queue() -> None:
+    async def scenario() -> list[httpx.Response]:
+        release = asyncio.Event()
+        transport = httpx.ASGITransport(app=make_app(release))
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as client:
+            running = asyncio.create_task(client.get("/slow"))
+            queued = asyncio.create_task(client.get("/slow"))
+            await asyncio.sleep(0.05)
+            shed = await client.get("/slow")
+            unlimited_write = await client.post("/write")
+            release.set()
+            return [await running, await queued, shed, unlimited_write]
+
+    running, queued, shed, unlimited_write = asyncio.run(scenario())
+    assert running.status_code == queued.status_code == 200
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"] == "3"
+    assert unlimited_write.status_code == 200
+
+
+def test_cancelled_waiter_keeps_no_permit() -> None:
+    async def scenario() -> None:
+        budget = Budget("read", limit=1, queue=2, timeout=5)
+        await budget.acquire()
+        waiter = asyncio.create_task(budget.acquire())
+        await asyncio.sleep(0)
+        # hand the permit over, then cancel before the waiter resumes
+        budget.release()
+        waiter.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await waiter
+        await asyncio.wait_for(budget.acquire(), 1)
+        assert budget.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_times_out_waiting() -> None:
+    async def scenario() -> None:
+        budget = Budget("read", limit=1, queue=1, timeout=0.01)
+        await budget.acquire()
+        with pytest.raises(Shed, match="timeout"):
+            await budget.acquire()
+
+    asyncio.run(scenario())
@@ -0,0 +1,118 @@
+from datetime import datetime
+
+import sqlalchemy
+from sqlmodel import create_engine
+
+from api.archive import archive_all
+from api.models import Endpointer, Post
+
+from .common import APP, mkclient
+
+
+def test_archive_and_include_archived(session):
+    client = mkclient()
+    client.post("/users", json={"name": "A", "email": "a@b.c", "password": "x"})
+    for name in ("old", "new"):
+        client.post("/posts", json={"name": name, "content": "c", "author": 1})
+    client.post("/comments", json={"content": "old", "author": 1, "post_id": 1})
+    client.post("/comments", json={"content": "new", "author": 1, "post_id": 1})
+    for table in ("post", "comment"):
+        session.exec(sqlalchemy.text(
+            f"UPDATE {table} SET created_at = '2020-01-01 00:00:00' WHERE id = 1",
+        ))
+    session.commit()
+
+    moved = archive_all(APP.state.db.writer, datetime(2021, 1, 1), batch_size=1)
+    assert moved == {"posts": 1, "comments": 1}
+
+    assert [p["name"] for p in client.get("/posts").json()] == ["new"]
+    assert client.get("/posts/1").status_code == 404
+    archived = client.get("/posts?include_archived=true&sort=-id").json()
+    assert [p["name"] for p in archived] == ["new", "old"]
+    assert client.get("/posts/1?include_archived=true").json()["name"] == "old"
+    assert client.get("/posts?include_archived=true&name=old").json()[0]["id"] == 1
+
+    assert [c["content"] for c in client.get("/comments?post_id=1").json()] == ["new"]
+    both = client.get("/comments?post_id=1&include_archived=true").json()
+    assert [c["content"] for c in both] == ["old", "new"]
+
+    # archived comments still count
+    assert client.get("/posts/1?include_archived=true").json()["comment_count"] == 2
+    assert Post.repair_counters(session) == 0
+    assert "include_archived" not in client.get("/tags?include_archived=true").text
+
+
+def test_archived_ids_and_tags(session):
+    client = mkclient()
+    client.post("/users", json={"name": "A", "email": "a@b.c", "password": "x"})
+    client.post("/tags", json={"name": "Art"})
+    client.post("/posts", json={"name": "old", "content": "c", "author": 1})
+    client.post("/tagged_posts", json={"tag_id": 1, "post_id": 1})
+    session.exec(sqlalchemy.text("UPDATE post SET created_at = '2020-01-01 00:00:00'"))
+    session.commit()
+
+    archive_all(APP.state.db.writer, datetime(2021, 1, 1))
+    assert client.get("/tagged_posts").json() == []
+    new = client.post("/posts", json={"name": "new", "content": "c", "author": 1}).json()
+    assert new["id"] == 2
+    assert new["tags"] == []
+
+    both = client.get("/posts?include_archived=true&sort=id").json()
+    assert [(p["id"], [t["name"] for t in p["tags"]]) for p in both] == [(1, ["Art"]), (2, [])]
+    tagged = client.get("/posts?include_archived=true&tags=1").json()
+    assert [p["name"] for p in tagged] == ["old"]
+    assert client.get("/posts/1?include_archived=true").json()["tag_count"] == 1
+
+
+def test_autoincrement_added_to_old_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    columns = (
+        "id INTEGER PRIMARY KEY, name VARCHAR, content VARCHAR, author INTEGER,"
+        " created_at DATETIME, updated_at DATETIME,"
+        " comment_count INTEGER NOT NULL DEFAULT 0, tag_count INTEGER NOT NULL DEFAULT 0"
+    )
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"CREATE TABLE post ({columns})")
+        conn.exec_driver_sql(f"CREATE TABLE post_archive ({columns})")
+        conn.exec_driver_sql("INSERT INTO post (id, name) VALUES (1, 'p')")
+        conn.exec_driver_sql("INSERT INTO post_archive (id, name) VALUES (5, 'q')")
+    Endpointer.init(engine)
+    Endpointer.init(engine)  # and leaves it alone the next time
+    with engine.begin() as conn:
+        created = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE name = 'post'",
+        ).scalar_one()
+        conn.exec_driver_sql("INSERT INTO post (name) VALUES ('r')")
+        conn.exec_driver_sql("INSERT INTO comment (post_id) VALUES (1)")
+        rows = conn.exec_driver_sql("SELECT id, name, comment_count FROM post").all()
+        indexes = {row[1] for row in conn.exec_driver_sql("PRAGMA index_list(post)")}
+    engine.dispose()
+    assert "AUTOINCREMENT" in created
+    assert [tuple(row) for row in rows] == [(1, "p", 1), (6, "r", 0)]
+    assert "ix_post_author_created_at" in indexes
+
+
+def test_archived_rows_in_stats_and_includes(session):
+    client = mkclient()
+    client.post("/users", json={"name": "A", "email": "a@b.c", "password": "x"})
+    client.post("/tags", json={"name": "Art"})
+    for name in ("old", "new"):
+        client.post("/posts", json={"name": name, "content": "c", "author": 1})
+    client.post("/tagged_posts", json={"tag_id": 1, "post_id": 1})
+    client.post("/comments", json={"content": "old", "author": 1, "post_id": 1})
+    client.post("/comments", json={"content": "new", "author": 1, "post_id": 1})
+    for table in ("post", "comment"):
+        session.exec(sqlalchemy.text(
+            f"UPDATE {table} SET created_at = '2020-01-01 00:00:00' WHERE id = 1",
+        ))
+    session.commit()
+    archive_all(APP.state.db.writer, datetime(2021, 1, 1))
+
+    assert sum(d["posts"] for d in client.get("/stats/posts/per_day").json()) == 2
+    assert client.get("/stats/tags/top").json()[0]["posts"] == 1
+    (author,) = client.get("/stats/authors/active").json()
+    assert (author["posts"], author["comments"]) == (2, 2)
+
+    post = client.get("/posts/1?include=comments&include_archived=true").json()
+    assert [c["content"] for c in post["comments"]] == ["old", "new"]
+    assert len(post["comments"]) == post["comment_count"]
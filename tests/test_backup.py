@@ -0,0 +1,59 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+from sqlmodel import create_engine
+
+from api import admin, backup
+from api.models import Endpointer
+
+from .common import APP, mkclient
+
+
+@pytest.fixture()
+def backups(session, tmp_path):
+    # a file of its own: the shared test database is in memory
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    Endpointer.init(engine)
+    Endpointer.connect(APP, engine)
+    backup.BACKUPS = backup.Backups(
+        engine, tmp_path / "backups", pages=1, sleep=0, keep=2,
+    )
+    admin.configure("secret")
+    yield backup.BACKUPS
+    backup.BACKUPS = None
+    admin.configure(None)
+
+
+def test_snapshot_and_retention(backups):
+    mkclient().post("/tags", json={"name": "Art"})
+    first = backups.run()
+    assert sqlite3.connect(first).execute("SELECT name FROM tag").fetchall() == [("Art",)]
+    backups.run()
+    backups.run()
+    assert len(backups.snapshots()) == 2
+    assert first not in backups.snapshots()
+
+
+def test_admin_endpoints(backups):
+    client = mkclient()
+    auth = {"X-Admin-Token": "secret"}
+    assert client.post("/admin/backups", headers=auth).status_code == 202
+    for _ in range(50):
+        if (status := client.get("/admin/backups", headers=auth).json())["snapshots"]:
+            break
+        time.sleep(0.1)
+    assert status["snapshots"][0]["name"].endswith(".db")
+
+
+def test_one_backup_at_a_time(backups, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(backups, "_run", lambda conn: release.wait(5))
+    client = mkclient()
+    auth = {"X-Admin-Token": "secret"}
+    try:
+        assert client.post("/admin/backups", headers=auth).status_code == 202
+        assert client.post("/admin/backups", headers=auth).status_code == 409
+    finally:
+        release.set()
@@ -1,6 +1,48 @@
-from .common import mkclient
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import create_engine
+
+from api import main
+from api.models import Endpointer
+
+from .common import APP, mkclient
 
 
 def test_root_working() -> None:
     r = mkclient().get("/")
     assert r.status_code == 200
+
+
+def test_apps_have_their_own_database(session) -> None:
+    other = main.create_app()
+    engine = create_engine(
+        "sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False},
+    )
+    Endpointer.init(engine)
+    Endpointer.connect(other, engine)
+    with TestClient(other) as client:
+        assert client.post("/tags", json={"name": "Elsewhere"}).status_code == 200
+        assert len(client.get("/tags").json()) == 1
+    assert mkclient().get("/tags").json() == []
+
+
+def test_apps_dont_share_caches_or_events(session) -> None:
+    other = main.create_app()
+    engine = create_engine(
+        "sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False},
+    )
+    Endpointer.init(engine)
+    Endpointer.connect(other, engine)
+    forum = {"name": "p", "content": "c", "author": 1}
+    with TestClient(other) as client:
+        client.post("/tags", json={"name": "Elsewhere"})
+        client.post("/posts", json=forum)
+        client.post("/tagged_posts", json={"tag_id": 1, "post_id": 1})
+        assert client.get("/posts/1").json()["tags"][0]["name"] == "Elsewhere"
+    client = mkclient()
+    client.post("/tags", json={"name": "Here"})
+    client.post("/posts", json=forum)
+    client.post("/tagged_posts", json={"tag_id": 1, "post_id": 1})
+    assert client.get("/posts/1").json()["tags"][0]["name"] == "Here"
+    assert len(other.state.db.hub("tags").since(0)) == 1
+    assert len(APP.state.db.hub("tags").since(0)) == 1
@@ -0,0 +1,37 @@
+from sqlmodel import Session
+
+from api.cache import LookupCache
+from api.models import Tag
+
+from .common import APP, mkclient
+
+
+def test_put_after_invalidation_is_dropped():
+    cache = LookupCache()
+    stamp = cache.stamp()
+    cache.invalidate(1)  # a write committed while the load was running
+    cache.put_many({1: "stale", 2: "fresh"}, stamp)
+    assert cache.get_many([1, 2]) == ({2: "fresh"}, {1})
+    cache.put_many({1: "reloaded"}, cache.stamp())
+    assert cache.get_many([1])[0] == {1: "reloaded"}
+
+
+def test_forgotten_invalidations_drop_older_puts():
+    cache = LookupCache(maxsize=1)
+    stamp = cache.stamp()
+    cache.invalidate(1)
+    cache.invalidate(2)  # pushes out the record of 1
+    cache.put_many({1: "stale"}, stamp)
+    assert len(cache) == 0
+
+
+def test_replica_reads_dont_fill_the_cache(session):
+    mkclient().post("/tags", json={"name": "Art"})
+    db = APP.state.db
+    cache = Tag.cache(db)
+    cache.clear()
+    replica = Session(session.connection(), info={"db": db, "replica": True})
+    assert Tag.lookup_many(replica, [1])[1].name == "Art"
+    assert len(cache) == 0
+    Tag.lookup_many(Session(session.connection(), info={"db": db}), [1])
+    assert len(cache) == 1
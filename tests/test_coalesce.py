@@ -0,0 +1,50 @@
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from sqlmodel import create_engine
+
+from api.coalesce import WriteCoalescer
+from api.models import Endpointer, Tag
+
+from .common import APP, mkclient
+
+
+@pytest.fixture()
+def coalescer(session):
+    db_file = tempfile.NamedTemporaryFile(mode="w+")
+    engine = create_engine(f"sqlite:///{Path(db_file.name)}")
+    coalescer = WriteCoalescer(engine, max_batch=50, max_delay=0.05)
+    Endpointer.init(engine)
+    Endpointer.connect(APP, engine, coalescer=coalescer)
+    yield coalescer
+    coalescer.close()
+
+
+def test_concurrent_creates_share_commits(coalescer):
+    client = mkclient()
+    with ThreadPoolExecutor(20) as pool:
+        responses = list(pool.map(
+            lambda n: client.post("/tags", json={"name": f"tag {n}"}),
+            range(20),
+        ))
+    assert all(r.status_code == 200 for r in responses)
+    assert sorted(r.json()["id"] for r in responses) == list(range(1, 21))
+    assert coalescer.writes == 20
+    assert coalescer.batches < 20
+
+
+def test_failed_write_is_isolated(coalescer):
+    def fail(session):
+        session.add(Tag.Table(name="rolled back"))
+        session.flush()
+        raise ValueError
+
+    with ThreadPoolExecutor(2) as pool:
+        failing = pool.submit(coalescer.submit, fail)
+        ok = pool.submit(coalescer.submit, lambda s: Tag.insert(s, {"name": "kept"}))
+        with pytest.raises(ValueError):
+            failing.result()
+        assert ok.result().name == "kept"
+    assert [tag["name"] for tag in mkclient().get("/tags").json()] == ["kept"]
@@ -0,0 +1,35 @@
+import anyio
+import anyio.to_thread
+from prometheus_client import REGISTRY
+from sqlmodel import create_engine
+
+from api import concurrency
+
+
+def test_configure_threads():
+    async def main():
+        concurrency.configure_threads(7)
+        assert anyio.to_thread.current_default_thread_limiter().total_tokens == 7
+        assert REGISTRY.get_sample_value("api_threadpool_size") == 7
+        assert REGISTRY.get_sample_value("api_threadpool_in_use") == 0
+
+    anyio.run(main)
+
+
+def test_pool_checkout_is_timed(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'db.sqlite'}", **concurrency.engine_kwargs(3),
+    )
+    replica = create_engine(
+        f"sqlite:///{tmp_path / 'db.sqlite'}",
+        **concurrency.engine_kwargs(3, "replica-0"),
+    )
+    sample = lambda name, pool: REGISTRY.get_sample_value(name, {"pool": pool})
+    count = lambda: sample("api_db_pool_checkout_seconds_count", "writer") or 0
+    before = count()
+    with engine.connect(), replica.connect(), replica.connect():
+        assert sample("api_db_pool_checked_out", "writer") == 1
+        assert sample("api_db_pool_checked_out", "replica-0") == 2
+    assert sample("api_db_pool_checked_out", "writer") == 0
+    assert count() == before + 1
+    assert engine.pool.size() == 3
@@ -0,0 +1,42 @@
+from sqlmodel import create_engine
+from starlette.requests import HTTPConnection
+
+from api.db import Database, client_key
+
+
+def test_readers_round_robin() -> None:
+    writer = create_engine("sqlite://")
+    readers = [create_engine("sqlite://"), create_engine("sqlite://")]
+    db = Database(writer, readers)
+    assert [db.reader() for _ in range(4)] == readers * 2
+
+
+def test_no_readers_reads_from_writer() -> None:
+    writer = create_engine("sqlite://")
+    assert Database(writer).reader() is writer
+
+
+def test_read_your_writes() -> None:
+    writer = create_engine("sqlite://")
+    reader = create_engine("sqlite://")
+    db = Database(writer, [reader], read_your_writes=60)
+    db.wrote("alice")
+    assert db.reader("alice") is writer
+    assert db.reader("bob") is reader
+    assert db.reader() is reader
+
+
+def test_client_key_prefers_explicit_id() -> None:
+    def conn(headers: dict[str, str]) -> HTTPConnection:
+        return HTTPConnection({
+            "type": "http",
+            "headers": [(k.encode(), v.encode()) for k, v in headers.items()],
+            "client": ("10.0.0.1", 1234),
+        })
+
+    behind_nat = client_key(conn({}))
+    assert behind_nat == client_key(conn({"user-agent": "other"}))
+    alice = client_key(conn({"x-client-id": "alice"}))
+    bob = client_key(conn({"cookie": "client_id=bob"}))
+    assert len({behind_nat, alice, bob}) == 3
+    assert client_key(conn({"x-client-id": "10.0.0.1"})) != behind_nat
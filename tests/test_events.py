@@ -0,0 +1,54 @@
+import asyncio
+
+from api import events
+
+from .common import APP, mkclient
+
+
+def test_ring_buffer_resume() -> None:
+    hub = events.EventHub(maxlen=2)
+    for n in range(3):
+        hub.publish("created", {"id": n})
+    assert [event.data["id"] for event in hub.since(1)] == [1, 2]
+    assert [event.data["id"] for event in hub.since(3)] == []
+    assert hub.since(0) is None  # event 1 has been dropped
+
+
+def test_resume_from_another_epoch() -> None:
+    hub = events.EventHub()
+    hub.publish("created", {"id": 1})
+    assert hub.parse(f"{hub.epoch}-1") == 1
+    assert hub.parse("0-1") is None
+    assert hub.since(2) is None  # never handed out
+
+    async def disconnected() -> bool:
+        return True
+
+    async def resume(last_event_id: str) -> list[str]:
+        stream = hub.stream(last_event_id, lambda event: True, disconnected)
+        return [chunk async for chunk in stream]
+
+    assert asyncio.run(resume(f"{hub.epoch}-0")) == [
+        f'id: {hub.epoch}-1\nevent: created\ndata: {{"id": 1}}\n\n',
+    ]
+    for stale in ("0-0", f"{hub.epoch}-7"):
+        assert asyncio.run(resume(stale))[0].startswith("event: reset\n")
+
+
+def test_routes_publish(session) -> None:
+    hub = APP.state.db.hub("comments")
+    before = hub.since(0)[-1].id if hub.since(0) else 0
+    client = mkclient()
+    client.post("/comments", json={"content": "a", "author": 1, "post_id": 1})
+    client.patch("/comments/1", json={"content": "b"})
+    client.delete("/comments/1")
+    published = hub.since(before)
+    assert [event.type for event in published] == ["created", "updated", "deleted"]
+    assert published[1].data["content"] == "b"
+    # deletions carry the whole row, so filtered subscribers see them
+    assert published[2].data["id"] == 1
+    assert published[2].data["post_id"] == 1
+
+
+def test_unknown_filter_rejected(session) -> None:
+    assert mkclient().get("/comments/events?nope=1").status_code == 422
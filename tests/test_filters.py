@@ -0,0 +1,55 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.loaders import CHUNK_SIZE
+from api.models import Comment, Post
+from api.utils import FILTER, FilterSet
+
+from .common import mkclient
+
+
+def test_unindexed_filter_refused() -> None:
+    with pytest.raises(ValueError, match="scan"):
+        FilterSet(Comment.Table, {"content": ("eq",)})
+    FilterSet(Comment.Table, {"content": ("eq",)}, allow_scan=frozenset({"content"}))
+
+
+def test_compiled_params() -> None:
+    params = Post.filter_set().params
+    assert params["author__in"] == ("author", "in", int)
+    assert params["earliest_created"] == params["created_at__gt"]
+
+
+def test_allowed_scan_alone(session) -> None:
+    client = mkclient()
+    assert client.get("/posts?latest_updated=2030-01-01T00:00:00Z").status_code == 200
+    assert client.get("/posts?tags=1&earliest_updated=2000-01-01T00:00:00Z").status_code == 200
+
+
+def test_scan_with_index_needs_an_indexed_filter() -> None:
+    filters = FilterSet(
+        Post.Table,
+        {"author": ("eq",), "updated_at": ("lt",)},
+        scan_with_index=frozenset({"updated_at"}),
+        indexed_params=("tags",),
+    )
+    app = FastAPI()
+
+    @app.get("/")
+    def route(found: FILTER = filters.dependency) -> list[str]:
+        return [condition.field for condition in found]
+
+    client = TestClient(app)
+    latest = "updated_at__lt=2030-01-01T00:00:00Z"
+    assert client.get(f"/?{latest}").status_code == 422
+    assert client.get(f"/?{latest}&author=1").json() == ["author", "updated_at"]
+    assert client.get(f"/?{latest}&tags=1").json() == ["updated_at"]
+    assert client.get("/").json() == []
+
+
+def test_in_list_length_limited(session) -> None:
+    client = mkclient()
+    ids = ",".join(map(str, range(CHUNK_SIZE)))
+    assert client.get(f"/posts?author__in={ids}").status_code == 200
+    assert client.get(f"/posts?author__in={ids},{CHUNK_SIZE}").status_code == 422
@@ -0,0 +1,40 @@
+import io
+import json
+import logging
+
+import pytest
+
+from api import log
+
+
+@pytest.fixture(autouse=True)
+def restore_api_logger():
+    logger = logging.getLogger("api")
+    handlers, level = list(logger.handlers), logger.level
+    yield
+    logger.handlers[:] = handlers
+    logger.setLevel(level)
+    logger.propagate = True
+    logging.getLogger("api.test_log").setLevel(logging.NOTSET)
+
+
+def test_records_are_written_off_thread_as_json():
+    stream = io.StringIO()
+    listener = log.setup("INFO", [("api.test_log", "DEBUG")], stream=stream)
+    logging.getLogger("api.test_log").debug("hello %s", "there", extra={"rows": 3})
+    logging.getLogger("api.other").debug("not enabled")
+    listener.stop()
+    (line,) = stream.getvalue().splitlines()
+    entry = json.loads(line)
+    assert entry["msg"] == "hello there"
+    assert entry["logger"] == "api.test_log"
+    assert entry["rows"] == 3
+
+
+def test_debug_sampling():
+    stream = io.StringIO()
+    listener = log.setup("DEBUG", debug_sample=0.0, stream=stream)
+    logging.getLogger("api.test_log").debug("dropped")
+    logging.getLogger("api.test_log").warning("kept")
+    listener.stop()
+    assert [json.loads(line)["msg"] for line in stream.getvalue().splitlines()] == ["kept"]
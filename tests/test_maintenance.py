@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import sqlalchemy
+from prometheus_client import REGISTRY
+from sqlmodel import create_engine
+
+from api import maintenance, shards
+
+
+def test_tasks(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    maintenance.enable_incremental_vacuum(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE t (x TEXT)")
+        conn.execute(
+            sqlalchemy.text("INSERT INTO t VALUES (:x)"), [{"x": "x" * 1000}] * 2000,
+        )
+        conn.exec_driver_sql("DELETE FROM t")
+    scheduler = maintenance.Scheduler(engine)
+    outcomes = {task.name: scheduler.run_task(task) for task in scheduler.tasks}
+    assert outcomes == {
+        "wal_checkpoint": "skipped",
+        "optimize": "ok",
+        "analyze": "ok",
+        "incremental_vacuum": "ok",
+    }
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA freelist_count").scalar() == 0
+    assert REGISTRY.get_sample_value(
+        "api_maintenance_runs_total", {"task": "optimize", "outcome": "ok"},
+    ) >= 1
+
+
+def test_window_and_due():
+    scheduler = maintenance.Scheduler(
+        None, window=maintenance.parse_window("23:00-02:00"),
+    )
+    assert scheduler.in_window(datetime(2024, 1, 1, 1, 30))
+    assert not scheduler.in_window(datetime(2024, 1, 1, 12, 0))
+    scheduler.window = None
+    assert {task.name for task in scheduler.due(0.0)} == {
+        "wal_checkpoint", "optimize", "analyze", "incremental_vacuum",
+    }
+    for task in scheduler.tasks:
+        task.last = 0.0
+    assert scheduler.due(400.0)[0].name == "wal_checkpoint"
+
+
+def test_wal(tmp_path):
+    db = tmp_path / "db.sqlite"
+    engine = create_engine(f"sqlite:///{db}")
+    files = shards.files(db)
+    shards.attach(engine, files)
+    maintenance.enable_wal(engine)
+    with engine.begin() as conn:
+        modes = {
+            schema: conn.exec_driver_sql(f'PRAGMA "{schema}".journal_mode').scalar()
+            for schema in ("main", *files)
+        }
+        conn.exec_driver_sql("CREATE TABLE t (x TEXT)")
+        conn.exec_driver_sql("INSERT INTO t VALUES ('x')")
+    assert set(modes.values()) == {"wal"}
+    scheduler = maintenance.Scheduler(engine)
+    (checkpoint,) = [task for task in scheduler.tasks if task.name == "wal_checkpoint"]
+    assert scheduler.run_task(checkpoint) == "ok"
+    engine.dispose()
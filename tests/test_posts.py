@@ -1,4 +1,8 @@
 import pytest
+import sqlalchemy
+from sqlmodel import create_engine
+
+from api.models import Endpointer, Post
 
 from .common import *
 
@@ -16,7 +20,10 @@ def obj_1():
 @pytest.fixture()
 def has_added_readonly_stuff():
     def has_added_readonly_stuff(data, obj, **kwargs):
-        keys = {"name", "content", "author", "id", "updated_at", "created_at", "tags"}
+        keys = {
+            "name", "content", "author", "id", "updated_at", "created_at", "tags",
+            "comment_count", "tag_count",
+        }
         return set(data.keys()) == keys
 
     return has_added_readonly_stuff
@@ -30,3 +37,95 @@ def obj_2():
 @pytest.fixture()
 def patched_obj_1():
     return {"author": 1}
+
+
+def test_include(session, path, obj_1):
+    client = mkclient()
+    client.post("/users", json={"name": "Alice", "email": "a@b.c", "password": "x"})
+    client.post(path, json=obj_1)
+    client.post("/tags", json={"name": "Art"})
+    client.post("/tagged_posts", json={"tag_id": 1, "post_id": 1})
+    client.post("/comments", json={"content": "Hi", "author": 1, "post_id": 1})
+
+    one = client.get(f"{path}/1?include=author,comments").json()
+    assert one["author_user"]["name"] == "Alice"
+    assert [comment["content"] for comment in one["comments"]] == ["Hi"]
+    assert [tag["name"] for tag in one["tags"]] == ["Art"]
+
+    many = client.get(f"{path}?include=comments").json()
+    assert "author_user" not in many[0]
+    assert len(many[0]["comments"]) == 1
+
+    assert client.get(f"{path}?include=nope").status_code == 422
+    # always embedded, so not an include
+    assert client.get(f"{path}?include=tags").status_code == 422
+
+
+def test_counters(session, created_objs, path):
+    client = mkclient()
+    client.post("/tags", json={"name": "Art"})
+    client.post("/tagged_posts", json={"tag_id": 1, "post_id": 1})
+    for content in ("a", "b"):
+        client.post("/comments", json={"content": content, "author": 1, "post_id": 1})
+    client.delete("/comments/1")
+
+    post = client.get(f"{path}/1").json()
+    assert (post["comment_count"], post["tag_count"]) == (1, 1)
+    by_comments = client.get(f"{path}?sort=comment_count&direction=desc").json()
+    assert [p["id"] for p in by_comments] == [1, 2]
+
+    session.exec(sqlalchemy.update(Post.Table).values(comment_count=5))
+    session.commit()
+    assert Post.repair_counters(session) == 2
+    session.commit()
+    assert client.get(f"{path}/1").json()["comment_count"] == 1
+
+
+def test_filters(created_objs, path):
+    client = mkclient()
+    client.post(path, json={"name": "other", "content": "c", "author": 2})
+    client.post("/tagged_posts", json={"tag_id": 1, "post_id": 2})
+    ids = lambda query: [post["id"] for post in client.get(f"{path}?{query}").json()]
+    assert ids("author=2") == [3]
+    assert ids("author__in=1,2") == [1, 2, 3]
+    assert ids("name__prefix=obj") == [1, 2]
+    assert ids("name=obj 2&tags=1") == [2]
+    assert client.get(f"{path}?author__in=x").status_code == 422
+
+
+def test_sort(created_objs, path):
+    client = mkclient()
+    ids = lambda query: [post["id"] for post in client.get(f"{path}?{query}").json()]
+    assert ids("sort=-created_at") == [2, 1]
+    assert ids("sort=-created_at,id") == [2, 1]
+    assert ids("sort=created_at,-id") == [1, 2]
+    assert ids("sort=-id") == [2, 1]
+    assert ids("direction=desc") == [2, 1]
+    assert ids("direction=asc") == [1, 2]
+    assert ids("author=1&sort=created_at") == [1, 2]
+    assert client.get(f"{path}?sort=content").status_code == 422
+    assert client.get(f"{path}?sort=author,-created_at").status_code == 422
+    assert client.get(f"{path}?sort=nope").status_code == 422
+
+
+def test_counters_added_to_old_database(session, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE post (id INTEGER PRIMARY KEY, name VARCHAR, content VARCHAR,"
+            " author INTEGER, created_at DATETIME, updated_at DATETIME)",
+        )
+        conn.exec_driver_sql(
+            "CREATE TABLE comment (id INTEGER PRIMARY KEY, content VARCHAR,"
+            " post_id INTEGER, author INTEGER, created_at DATETIME, updated_at DATETIME)",
+        )
+        conn.exec_driver_sql("INSERT INTO post (id, name) VALUES (1, 'p'), (2, 'q')")
+        conn.exec_driver_sql("INSERT INTO comment (post_id) VALUES (1), (1)")
+    Endpointer.init(engine)
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(
+            "SELECT id, comment_count, tag_count FROM post ORDER BY id",
+        ).all()
+        indexes = {row[1] for row in conn.exec_driver_sql("PRAGMA index_list(post)")}
+    assert [tuple(row) for row in rows] == [(1, 2, 0), (2, 0, 0)]
+    assert "ix_post_comment_count" in indexes
@@ -0,0 +1,67 @@
+import contextvars
+import cProfile
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api import admin, profiling
+
+from .common import APP
+
+
+@pytest.fixture()
+def client(session, tmp_path):
+    admin.configure("secret")
+    yield TestClient(profiling.ProfilingMiddleware(APP, directory=tmp_path))
+    admin.configure(None)
+
+
+def test_profile_on_request(client):
+    assert "x-profile-id" not in client.get("/tags").headers
+    # the header alone isn't enough
+    assert "x-profile-id" not in client.get("/tags", headers={"X-Profile": "1"}).headers
+
+    auth = {"X-Admin-Token": "secret"}
+    r = client.get("/posts?tags=1", headers={"X-Profile": "1"} | auth)
+    profile_id = r.headers["x-profile-id"]
+
+    (listed,) = client.get("/admin/profiles", headers=auth).json()
+    assert listed["id"] == profile_id
+    assert listed["path"] == "/posts"
+    text = client.get(f"/admin/profiles/{profile_id}?limit=1000", headers=auth).text
+    assert "query_apply" in text
+    by_time = client.get(f"/admin/profiles/{profile_id}?sort=tottime", headers=auth)
+    assert "internal time" in by_time.text
+    assert client.get(f"/admin/profiles/{profile_id}?sort=nope", headers=auth).status_code == 422
+    assert client.get(f"/admin/profiles/{profile_id}.prof", headers=auth).status_code == 200
+
+
+def test_admin_routes_need_token(client):
+    assert client.get("/admin/profiles").status_code == 403
+    assert client.get("/admin/profiles", headers={"X-Admin-Token": "x"}).status_code == 403
+
+
+def test_profiled_thread_under_loop_profiler():
+    # the middleware profiles the event loop while sync routes run in worker
+    # threads; from 3.12 a second profiler there would raise ValueError
+    def in_worker():
+        return sum(range(10))
+
+    request_profile = profiling.RequestProfile()
+    token = profiling.ACTIVE.set(request_profile)
+    loop_profile = cProfile.Profile()
+    loop_profile.enable()
+    try:
+        with ThreadPoolExecutor(1) as pool:
+            result = pool.submit(contextvars.copy_context().run, profiling.profiled(in_worker))
+            assert result.result() == 45
+    finally:
+        loop_profile.disable()
+        profiling.ACTIVE.reset(token)
+    request_profile.profiles.append(loop_profile)
+    stats = request_profile.stats()
+    stats.stream = out = io.StringIO()
+    stats.print_stats()
+    assert "in_worker" in out.getvalue()
@@ -0,0 +1,96 @@
+import sqlite3
+import time
+
+import pytest
+from sqlmodel import create_engine
+
+from api import backup, shards
+from api.coalesce import WriteCoalescer
+from api.models import Endpointer
+
+from .common import APP, mkclient
+
+
+@pytest.fixture()
+def sharded(session, tmp_path):
+    db = tmp_path / "forum.db"
+    engine = create_engine(f"sqlite:///{db}")
+    files = shards.files(db)
+    shards.attach(engine, files)
+    Endpointer.init(engine, shards=files)
+    Endpointer.connect(APP, engine)
+    yield engine, db, files["posts"]
+    engine.dispose()
+
+
+def tables(file):
+    rows = sqlite3.connect(file).execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'",
+    )
+    return {name for (name,) in rows}
+
+
+def test_tables_and_cross_shard_reads(sharded):
+    _, db, posts = sharded
+    assert tables(db) == {"user", "tag"}
+    assert tables(posts) == {
+        "post", "post_archive", "comment", "comment_archive", "tagged_post", "tagged_post_archive",
+    }
+
+    client = mkclient()
+    client.post("/users", json={"name": "A", "email": "a@b.c", "password": "x"})
+    client.post("/tags", json={"name": "Art"})
+    client.post("/posts", json={"name": "p", "content": "c", "author": 1})
+    client.post("/tagged_posts", json={"tag_id": 1, "post_id": 1})
+    client.post("/comments", json={"content": "hi", "author": 1, "post_id": 1})
+    post = client.get("/posts/1?include=author").json()
+    assert post["tags"][0]["name"] == "Art"
+    assert post["author_user"]["name"] == "A"
+    assert post["comment_count"] == 1
+    assert client.get("/stats/tags/top").json()[0]["name"] == "Art"
+
+
+def test_writes_to_other_shards_dont_wait(sharded):
+    _, _, posts = sharded
+    locker = sqlite3.connect(posts, isolation_level=None)
+    locker.execute("BEGIN IMMEDIATE")
+    try:
+        assert mkclient().post("/tags", json={"name": "Art"}).status_code == 200
+    finally:
+        locker.rollback()
+
+
+def test_backup_copies_shards(sharded, tmp_path):
+    engine, _, _ = sharded
+    mkclient().post("/posts", json={"name": "p", "content": "c", "author": 1})
+    snapshot = backup.Backups(engine, tmp_path / "backups", sleep=0).run()
+    (copy,) = backup.Backups.shard_copies(snapshot)
+    assert copy.name == f"{snapshot.stem}.posts.db"
+    assert sqlite3.connect(copy).execute("SELECT name FROM post").fetchall() == [("p",)]
+
+
+def test_coalesced_writes_to_other_shards_dont_wait(sharded):
+    engine, _, posts = sharded
+    coalescer = WriteCoalescer(engine, max_batch=1)
+    Endpointer.connect(APP, engine, coalescer=coalescer)
+    locker = sqlite3.connect(posts, isolation_level=None)
+    locker.execute("BEGIN IMMEDIATE")
+    try:
+        start = time.monotonic()
+        assert mkclient().post("/tags", json={"name": "Art"}).status_code == 200
+        assert time.monotonic() - start < 1
+    finally:
+        locker.rollback()
+        coalescer.close()
+
+
+def test_refuses_to_shard_a_single_file_database(tmp_path):
+    db = tmp_path / "forum.db"
+    engine = create_engine(f"sqlite:///{db}")
+    Endpointer.init(engine)
+    engine.dispose()
+    files = shards.files(db)
+    shards.attach(engine, files)
+    with pytest.raises(RuntimeError, match="post, post_archive"):
+        Endpointer.init(engine, shards=files)
+    engine.dispose()
@@ -0,0 +1,128 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from api.singleflight import SingleFlightMiddleware
+
+
+def test_identical_gets_share_one_execution() -> None:
+    calls = []
+
+    async def scenario() -> list[httpx.Response]:
+        release = asyncio.Event()
+        app = FastAPI()
+        app.add_middleware(SingleFlightMiddleware)
+
+        @app.get("/posts")
+        async def posts(a: int = 0, b: int = 0) -> dict[str, int]:
+            calls.append((a, b))
+            await release.wait()
+            return {"calls": len(calls)}
+
+        @app.post("/posts")
+        async def create() -> dict[str, bool]:
+            return {"ok": True}
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as client:
+            first = asyncio.create_task(client.get("/posts?a=1&b=2"))
+            await asyncio.sleep(0.01)
+            same = asyncio.create_task(client.get("/posts?b=2&a=1"))
+            other = asyncio.create_task(client.get("/posts?a=2"))
+            await asyncio.sleep(0.01)
+            await client.post("/posts")
+            after_write = asyncio.create_task(client.get("/posts?a=1&b=2"))
+            await asyncio.sleep(0.01)
+            release.set()
+            return [await first, await same, await other, await after_write]
+
+    first, same, other, after_write = asyncio.run(scenario())
+    assert first.json() == same.json()
+    assert sorted(calls) == [(1, 2), (1, 2), (2, 0)]
+    assert all(r.status_code == 200 for r in (first, same, other, after_write))
+
+
+def test_reads_after_a_write_dont_join_flights_started_during_it() -> None:
+    calls = []
+
+    async def scenario() -> list[httpx.Response]:
+        writing = asyncio.Event()
+        release_write = asyncio.Event()
+        release_read = asyncio.Event()
+        app = FastAPI()
+        app.add_middleware(SingleFlightMiddleware)
+
+        @app.get("/posts")
+        async def posts() -> dict[str, int]:
+            calls.append(len(calls))
+            await release_read.wait()
+            return {"calls": len(calls)}
+
+        @app.post("/posts")
+        async def create() -> dict[str, bool]:
+            writing.set()
+            await release_write.wait()
+            return {"ok": True}
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as client:
+            write = asyncio.create_task(client.post("/posts"))
+            await writing.wait()
+            during = asyncio.create_task(client.get("/posts"))
+            await asyncio.sleep(0.01)
+            release_write.set()
+            await write
+            after = asyncio.create_task(client.get("/posts"))
+            await asyncio.sleep(0.01)
+            release_read.set()
+            return [await during, await after]
+
+    during, after = asyncio.run(scenario())
+    assert len(calls) == 2
+    assert after.json() == {"calls": 2}
+
+
+def test_credentials_and_clients_in_key() -> None:
+    scope = {
+        "type": "http",
+        "path": "/posts",
+        "query_string": b"",
+        "headers": [(b"x-admin-token", b"secret")],
+        "client": ("10.0.0.1", 1234),
+    }
+    other_client = scope | {"client": ("10.0.0.2", 1234)}
+    shared = SingleFlightMiddleware(FastAPI())
+    assert shared.key(scope) != shared.key(scope | {"headers": []})
+    assert shared.key(scope) == shared.key(other_client)
+    per_client = SingleFlightMiddleware(FastAPI(), per_client=True)
+    assert per_client.key(scope) != per_client.key(other_client)
+    named = scope | {"headers": [*scope["headers"], (b"x-client-id", b"alice")]}
+    assert per_client.key(named) == per_client.key(named | {"client": other_client["client"]})
+
+
+def test_admin_routes_not_coalesced() -> None:
+    calls = []
+
+    async def scenario() -> None:
+        release = asyncio.Event()
+        app = FastAPI()
+        app.add_middleware(SingleFlightMiddleware)
+
+        @app.get("/admin/slow-queries")
+        async def slow_queries() -> dict[str, int]:
+            calls.append(1)
+            await release.wait()
+            return {}
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as client:
+            first = asyncio.create_task(client.get("/admin/slow-queries"))
+            second = asyncio.create_task(client.get("/admin/slow-queries"))
+            await asyncio.sleep(0.01)
+            release.set()
+            await first
+            await second
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
@@ -0,0 +1,76 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+from sqlmodel import create_engine
+
+from api import admin, slowlog
+
+from .common import APP
+
+
+@pytest.fixture()
+def slow_log(session):
+    log = slowlog.SlowQueryLog(threshold=0)
+    engine = APP.state.db.writer.engine
+    log.install(engine)
+    admin.configure("secret")
+    yield log
+    admin.configure(None)
+    log.uninstall(engine)
+
+
+def test_shape():
+    assert slowlog.shape("SELECT *\n FROM t WHERE id IN (?, ?, ?) AND x = 'a''b' LIMIT 10") == (
+        "SELECT * FROM t WHERE id IN (?...) AND x = ? LIMIT ?"
+    )
+
+
+def test_slow_queries_are_aggregated(slow_log, monkeypatch):
+    monkeypatch.setattr(slowlog, "SLOW_QUERIES", slow_log)
+    client = TestClient(slowlog.RouteMiddleware(APP))
+    client.get("/tags?name=x")
+    client.get("/tags?name=y")
+
+    report = client.get("/admin/slow-queries", headers={"X-Admin-Token": "secret"}).json()
+    (tags,) = [s for s in report["shapes"] if s["statement"].startswith("SELECT tag.")]
+    assert tags["count"] == tags["slow"] == 2
+    assert tags["routes"] == {"GET /tags": 2}
+    assert any("ix_tag_name" in step for step in tags["plan"])
+    assert report["recent"][0]["route"] == "GET /tags"
+
+
+def test_parameters_are_redacted(slow_log, monkeypatch, caplog):
+    assert slowlog.redact((1, "a@b.c", None, b"x")) == (1, "<str>", None, "<bytes>")
+    monkeypatch.setattr(slowlog, "SLOW_QUERIES", slow_log)
+    client = TestClient(slowlog.RouteMiddleware(APP))
+    user = {"name": "A", "email": "secret@example.com", "password": "hunter2"}
+    client.post("/users", json=user)
+
+    report = client.get("/admin/slow-queries", headers={"X-Admin-Token": "secret"}).json()
+    logged = [record.parameters for record in caplog.records if hasattr(record, "parameters")]
+    assert logged
+    for text in (str(report), str(logged)):
+        assert "secret@example.com" not in text
+        assert "scrypt$" not in text
+
+
+def test_failed_statement_drops_its_start(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    log = slowlog.SlowQueryLog(threshold=0)
+    log.install(engine)
+    with engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.exec_driver_sql("SELECT * FROM missing")
+        assert conn.connection.info.get("query_start") == []
+        conn.exec_driver_sql("SELECT 1")
+        assert conn.connection.info["query_start"] == []
+
+
+def test_shapes_are_bounded(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    log = slowlog.SlowQueryLog(max_shapes=2)
+    log.install(engine)
+    with engine.connect() as conn:
+        for statement in ("SELECT 1", "SELECT 'a'", "SELECT 1", "SELECT x'00'"):
+            conn.exec_driver_sql(statement)
+    assert list(log.shapes) == ["SELECT ?", "SELECT x?"]
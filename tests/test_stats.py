@@ -0,0 +1,47 @@
+import pytest
+
+from api import stats
+
+from .common import APP, mkclient
+
+
+@pytest.fixture()
+def forum(session):
+    client = mkclient()
+    for name in ("Alice", "Bob"):
+        client.post("/users", json={"name": name, "email": "x", "password": "x"})
+    for name in ("Art", "Big Data"):
+        client.post("/tags", json={"name": name})
+    for author in (1, 1, 2):
+        client.post("/posts", json={"name": "p", "content": "c", "author": author})
+    for tag_id, post_id in ((1, 1), (2, 1), (2, 2), (2, 3)):
+        client.post("/tagged_posts", json={"tag_id": tag_id, "post_id": post_id})
+    for author in (2, 2, 2):
+        client.post("/comments", json={"content": "c", "author": author, "post_id": 1})
+
+
+def test_posts_per_day(forum):
+    data = mkclient().get("/stats/posts/per_day").json()
+    assert len(data) == 1
+    assert data[0]["posts"] == 3
+
+
+def test_top_tags(forum):
+    data = mkclient().get("/stats/tags/top?limit=1").json()
+    assert data == [{"tag_id": 2, "name": "Big Data", "posts": 3}]
+
+
+def test_active_authors(forum):
+    data = mkclient().get("/stats/authors/active").json()
+    assert data == [
+        {"user_id": 2, "name": "Bob", "posts": 1, "comments": 3},
+        {"user_id": 1, "name": "Alice", "posts": 2, "comments": 0},
+    ]
+
+
+def test_incremental_refresh(forum):
+    client = mkclient()
+    assert client.get("/stats/posts/per_day").json()[0]["posts"] == 3
+    client.post("/posts", json={"name": "p", "content": "c", "author": 1})
+    stats.aggregate(APP.state.db, "posts").refresh_after = 0
+    assert client.get("/stats/posts/per_day").json()[0]["posts"] == 4
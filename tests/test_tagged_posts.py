@@ -31,7 +31,7 @@ def has_added_readonly_stuff():
     return lambda ignore1, ignore2: True
 
 
-def test_create_and_read_one(path, obj_1):
+def test_create_and_read_one(created_objs, path, obj_1):
     r = mkclient().get(f"{path}?post_id=1&tag_id=1")
     assert r.status_code == 200
     assert r.json() == [obj_1]
@@ -1,5 +1,7 @@
 import pytest
 
+from api.models import Tag
+
 from .common import *
 
 
@@ -25,3 +27,16 @@ def obj_2():
 @pytest.fixture()
 def patched_obj_1():
     return {"name": "Tra"}
+
+
+def test_cached_lookup_is_invalidated(created_objs, path):
+    client = mkclient()
+    client.post("/posts", json={"name": "p", "content": "c", "author": 1})
+    client.post("/tagged_posts", json={"tag_id": 1, "post_id": 1})
+    assert client.get("/posts/1").json()["tags"][0]["name"] == "Art"
+    cache = Tag.cache(APP.state.db)
+    hits = cache.hits
+    client.patch(f"{path}/1", json={"name": "Craft"})
+    assert client.get("/posts/1").json()["tags"][0]["name"] == "Craft"
+    assert client.get("/posts/1").json()["tags"][0]["name"] == "Craft"
+    assert cache.hits == hits + 1
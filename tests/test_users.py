@@ -1,5 +1,10 @@
 import pytest
 
+import sqlmodel
+
+from api import credentials
+from api.models import User
+
 from .common import *
 
 
@@ -25,3 +30,79 @@ def obj_2():
 @pytest.fixture()
 def patched_obj_1():
     return {"name": "Not Alice"}
+
+
+@pytest.fixture()
+def has_added_readonly_stuff():
+    # the password is write-only
+    def has_added_readonly_stuff(data, obj, id=1, **kwargs):
+        obj = {key: value for key, value in obj.items() if key != "password"}
+        return data == obj | {"id": id}
+
+    return has_added_readonly_stuff
+
+
+def test_password_is_hashed(session, obj_1):
+    client = mkclient()
+    client.post("/users", json=obj_1)
+    stored = session.exec(sqlmodel.select(User.Table)).one().password
+    assert stored.startswith("scrypt$")
+    assert credentials.verify_password("alice_password", stored)
+
+
+def test_login(created_objs, obj_1):
+    client = mkclient()
+    login = {"email": obj_1["email"], "password": obj_1["password"]}
+    r = client.post("/users/login", json=login)
+    assert r.status_code == 200
+    assert r.json() == {"id": 1, "name": "Alice", "email": "alice@example.com"}
+    assert client.post("/users/login", json=login | {"password": "x"}).status_code == 401
+    assert client.post("/users/login", json=login | {"email": "x"}).status_code == 401
+
+    client.patch("/users/1", json={"password": "new"})
+    assert client.post("/users/login", json=login | {"password": "new"}).status_code == 200
+
+
+def test_login_upgrades_plaintext_password(session, created_objs, obj_1):
+    user = session.get(User.Table, 1)
+    user.password = obj_1["password"]
+    session.add(user)
+    session.commit()
+    login = {"email": obj_1["email"], "password": obj_1["password"]}
+    client = mkclient()
+    assert client.post("/users/login", json=login | {"password": "x"}).status_code == 401
+    assert client.post("/users/login", json=login).status_code == 200
+    session.expire_all()
+    stored = session.get(User.Table, 1).password
+    assert stored.startswith("scrypt$")
+    assert client.post("/users/login", json=login).status_code == 200
+
+
+def test_rehash_keeps_a_changed_password(session, created_objs, obj_1):
+    changed = session.get(User.Table, 1).password
+    User.rehash(session, 1, obj_1["password"], obj_1["password"])
+    session.expire_all()
+    assert session.get(User.Table, 1).password == changed
+
+
+def test_unknown_email_costs_a_hash(created_objs, monkeypatch):
+    verified = []
+    real = credentials.verify_password
+
+    def verify_password(password, stored):
+        verified.append(stored)
+        return real(password, stored)
+
+    monkeypatch.setattr(credentials, "verify_password", verify_password)
+    login = {"email": "nobody@example.com", "password": "x"}
+    assert mkclient().post("/users/login", json=login).status_code == 401
+    assert len(verified) == 1
+    assert verified[0].startswith("scrypt$")
+
+
+def test_hash_queue_capped_by_threads():
+    pool = credentials.configure(2, 32, n=2**4, threads=40)
+    try:
+        assert pool._slots._value == 10
+    finally:
+        credentials.configure(2, 32, n=2**4)